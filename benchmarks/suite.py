@@ -0,0 +1,235 @@
+#
+# ABOUT THIS MODULE
+#
+# A benchmark suite for the invoke_poetry hot paths: every benchmark runs inside a throwaway poetry project with
+# several local venvs, and reports timings and the number of spawned subprocesses. Results can be saved as JSON and
+# compared between commits. Use it through the `bench` invoke task.
+#
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from contextlib import contextmanager, redirect_stdout
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, List, Optional
+
+from invoke import Context  # type: ignore[attr-defined]
+
+from invoke_poetry import init_ns, poetry_runner, task_matrix
+from invoke_poetry.env import active_env
+from invoke_poetry.poetry_api import PoetryAPI
+from invoke_poetry.utils import on_subprocess_spawn
+
+
+@dataclass
+class BenchmarkResult:
+    """The timings (in seconds) and spawned subprocesses of every run of a benchmark. Subprocesses are empty when
+    they could not be counted."""
+
+    name: str
+    timings: List[float] = field(default_factory=lambda: [])
+    subprocesses: List[int] = field(default_factory=lambda: [])
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.timings)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON serializable representation of the result, with some statistics."""
+        return {
+            **asdict(self),
+            "min": min(self.timings),
+            "mean": statistics.mean(self.timings),
+            "median": self.median,
+        }
+
+
+def measure(
+    name: str,
+    func: Callable[[], Any],
+    repeat: int,
+    setup: Optional[Callable[[], Any]] = None,
+) -> BenchmarkResult:
+    """Run `func` `repeat` times, timing it and counting the subprocesses it spawns. `setup` is run, untimed, before
+    every run."""
+    result = BenchmarkResult(name=name)
+    for _ in range(repeat):
+        if setup:
+            setup()
+        pids: List[int] = []
+        with on_subprocess_spawn(pids.append), redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            result.timings.append(time.perf_counter() - start)
+        result.subprocesses.append(len(pids))
+    return result
+
+
+@contextmanager
+def throwaway_project(versions: List[str]) -> Generator[Path, None, None]:
+    """Create a temporary poetry project with a venv for every given version and move into it. The first version env
+    is the active one."""
+    previous_cwd = Path.cwd()
+    project = Path(tempfile.mkdtemp(prefix="invoke-poetry-bench-"))
+    try:
+        (project / "poetry.toml").write_text(
+            '[virtualenvs]\nin-project = false\npath = ".venvs"\n'
+        )
+        (project / "pyproject.toml").write_text(
+            textwrap.dedent(
+                """
+                [tool.poetry]
+                name = "bench"
+                version = "0.1.0"
+                description = ""
+                authors = ["bench <bench@example.com>"]
+
+                [tool.poetry.dependencies]
+                python = "^3.8"
+
+                [build-system]
+                requires = ["poetry-core>=1.0.0"]
+                build-backend = "poetry.core.masonry.api"
+                """
+            )
+        )
+        os.chdir(project)
+        init_ns(versions[0], versions)
+        for version in versions:
+            PoetryAPI.create_env(version)
+        PoetryAPI.activate_env(versions[0])
+        yield project
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(project, ignore_errors=True)
+        PoetryAPI.init()
+
+
+def run_suite(versions: List[str], repeat: int = 5) -> List[BenchmarkResult]:
+    """Run all benchmarks in a throwaway project with envs for the given versions (at least two are needed)."""
+    if len(versions) < 2:
+        raise ValueError(
+            "At least two python versions are needed to run the benchmarks"
+        )
+    c = Context()
+    results = [measure_import_time(versions[0], repeat)]
+
+    with throwaway_project(versions):
+
+        def env_discovery() -> None:
+            PoetryAPI.get_available_env_names()
+            PoetryAPI.get_active_project_env_version()
+
+        results.append(
+            measure(
+                "env_discovery_cold",
+                env_discovery,
+                repeat,
+                setup=PoetryAPI.invalidate_cache,
+            )
+        )
+        results.append(measure("env_discovery_warm", env_discovery, repeat))
+
+        def switch_and_rollback() -> None:
+            with active_env(versions[1], rollback_env=True):
+                pass
+
+        results.append(
+            measure("active_env_switch_rollback", switch_and_rollback, repeat)
+        )
+
+        def runner(**kwargs: Any) -> Callable[[], None]:
+            def run_command() -> None:
+                with poetry_runner(
+                    c, python_env=versions[0], quiet=True, **kwargs
+                ) as run:
+                    run("true", hide=True)
+
+            return run_command
+
+        results.append(measure("poetry_runner_poetry_run", runner(), repeat))
+        results.append(
+            measure("poetry_runner_no_poetry_run", runner(poetry_run=False), repeat)
+        )
+        results.append(measure("poetry_runner_direct", runner(direct=True), repeat))
+
+        def matrix() -> None:
+            task_matrix(
+                hook=lambda: None,
+                hook_args_builder=lambda _: ([], {}),
+                task_names=[f"task_{i}" for i in range(10)],
+                print_steps=False,
+            )
+
+        results.append(measure("task_matrix_overhead", matrix, repeat))
+    return results
+
+
+def measure_import_time(version: str, repeat: int) -> BenchmarkResult:
+    """Measure, in a fresh interpreter, the time needed to import invoke_poetry and call `init_ns`. Subprocesses are
+    not counted."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        "from invoke_poetry import init_ns; "
+        f"init_ns('{version}'); "
+        "print(time.perf_counter() - start)"
+    )
+    result = BenchmarkResult(name="init_ns_import")
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", code], text=True)
+        result.timings.append(float(output.strip().splitlines()[-1]))
+    # the subprocesses of the fresh interpreter can't be counted from here: leave them out
+    return result
+
+
+def get_report(
+    results: List[BenchmarkResult], baseline: Optional[Dict[str, Any]] = None
+) -> List[str]:
+    """Return a printable report of the results, comparing medians to the baseline ones, if given."""
+    baseline_results = (baseline or {}).get("results", {})
+    lines = [f"{'benchmark':<32}{'median':>12}{'min':>12}{'subprocesses':>14}"]
+    for result in results:
+        line = (
+            f"{result.name:<32}{result.median * 1000:>10.2f}ms{min(result.timings) * 1000:>10.2f}ms"
+            f"{max(result.subprocesses) if result.subprocesses else '':>14}"
+        )
+        if result.name in baseline_results:
+            old_median = baseline_results[result.name]["median"]
+            if old_median:
+                line += f"{(result.median - old_median) / old_median:>+10.1%}"
+        lines.append(line)
+    return lines
+
+
+def get_json_report(results: List[BenchmarkResult]) -> Dict[str, Any]:
+    """Return a JSON serializable report of the results, with some information about the environment."""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "meta": {
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "results": {result.name: result.to_dict() for result in results},
+    }
+
+
+def load_json_report(path: Path) -> Dict[str, Any]:
+    """Load a previously saved JSON report."""
+    return dict(json.loads(path.read_text()))
@@ -1,3 +1,4 @@
+from invoke_poetry.aio import async_poetry_runner, async_task_matrix
 from invoke_poetry.decorator import as_task
 from invoke_poetry.env import remember_active_env
 from invoke_poetry.main import (
@@ -8,14 +9,19 @@ from invoke_poetry.main import (
     install_project_dependencies,
     poetry_runner,
 )
-from invoke_poetry.matrix import TaskMatrix, task_matrix
+from invoke_poetry.matrix import RetryPolicy, TaskMatrix, task_matrix
+from invoke_poetry.matrix_builder import MatrixBuilder
 
 __all__ = [
     "add_sub_collection",
+    "async_poetry_runner",
+    "async_task_matrix",
     "init_ns",
     "install_project_dependencies",
     "poetry_runner",
     "remember_active_env",
+    "MatrixBuilder",
+    "RetryPolicy",
     "TaskMatrix",
     "task_matrix",
     "get_additional_args",
@@ -0,0 +1,255 @@
+import asyncio
+import codecs
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import (
+    IO,
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from invoke import Result  # type: ignore[attr-defined]
+from invoke.exceptions import UnexpectedExit
+
+from invoke_poetry.env import env_get_path, get_venv_environ, validate_env_version
+from invoke_poetry.matrix import MatrixTask, TaskMatrix, TaskState
+from invoke_poetry.reports import JsonLinesReporter, JUnitReporter, MatrixReporter
+from invoke_poetry.utils import describe_exception, get_return_code, kill_process_tree
+
+#
+# ABOUT THIS MODULE
+#
+# asyncio counterparts of `poetry_runner` and `task_matrix`, for async tooling and for driving many lightweight
+# commands concurrently without a thread for each one.
+#
+# The async runner launches commands as asyncio subprocesses inside the given env, like a direct `poetry_runner`
+# does: the active env is never switched, so that any number of runners can be used at the same time. Commands
+# results are invoke `Result` objects and failed commands raise invoke `UnexpectedExit`, like `Context.run` does.
+#
+
+AsyncRunner = Callable[..., Awaitable[Result]]
+
+
+@asynccontextmanager
+async def async_poetry_runner(
+    python_env: Optional[str] = None, quiet: bool = False
+) -> AsyncGenerator[AsyncRunner, None]:
+    """Async context manager offering an awaitable runner that launches commands in the poetry env of the given
+    python version (the default one if None), creating the env if needed.
+
+    ```python
+    async def get_version(python_version: str = "3.7"):
+        async with async_poetry_runner(python_env=python_version) as run:
+            await run("python --version")
+    ```
+    """
+    python_env = validate_env_version(python_env)
+    # poetry is not async: resolve the env in a worker thread, so that other coroutines can go on meanwhile
+    venv_path = await asyncio.get_running_loop().run_in_executor(
+        None, env_get_path, python_env, quiet
+    )
+    yield async_venv_runner(venv_path)
+
+
+def async_venv_runner(venv_path: Path) -> AsyncRunner:
+    """Return an awaitable runner that launches commands inside the specified venv, without activating it."""
+    environ = get_venv_environ(venv_path)
+
+    async def run(
+        command: str,
+        warn: bool = False,
+        hide: bool = False,
+        env: Optional[Dict[str, str]] = None,
+    ) -> Result:
+        """Launch the command in a shell and return its result. Its output is printed as it comes, unless `hide` is
+        set. Unless `warn` is set, raise an invoke UnexpectedExit if the command fails. If cancelled, the command is
+        killed."""
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env={**environ, **(env or {})},
+            # in its own process group, so that the shell can be killed along with its children
+            start_new_session=True,
+        )
+        readers = asyncio.gather(
+            _read_stream(process.stdout, None if hide else sys.stdout),
+            _read_stream(process.stderr, None if hide else sys.stderr),
+        )
+        try:
+            stdout, stderr = await readers
+            return_code = await process.wait()
+        except asyncio.CancelledError:
+            kill_process_tree(process.pid)
+            # read the pipes to their end, now that the command is gone, so that they get closed: left to the garbage
+            # collector, they may outlive the event loop
+            await asyncio.gather(readers, process.wait(), return_exceptions=True)
+            raise
+        result = Result(
+            stdout=stdout,
+            stderr=stderr,
+            command=command,
+            exited=return_code,
+            hide=("stdout", "stderr") if hide else (),
+        )
+        if not result.ok and not warn:
+            raise UnexpectedExit(result)
+        return result
+
+    return run
+
+
+async def async_task_matrix(
+    hook: Callable[..., Awaitable[Any]],
+    hook_args_builder: Callable[[str], Tuple[List[Any], Dict[str, Any]]],
+    task_names: Iterable[str],
+    print_steps: bool = True,
+    max_concurrency: Optional[int] = None,
+    json_report: Optional[Path] = None,
+    junit_report: Optional[Path] = None,
+    fail_fast: bool = False,
+    max_failures: Optional[int] = None,
+    cancel_running: bool = False,
+) -> TaskMatrix:
+    """Await the coroutine `hook` function once for every task name provided, concurrently. The hook args are built
+    using the `hook_args_builder` hook, which receives the current task name. At most `max_concurrency` hooks run at
+    the same time, if given.
+
+    ```python
+    async def print_python_version(python_version: str) -> None:
+        async with async_poetry_runner(python_env=python_version) as run:
+            await run("python --version")
+
+    @task
+    def matrix(c: Context) -> None:
+        results = asyncio.run(
+            async_task_matrix(
+                hook=print_python_version,
+                hook_args_builder=lambda name: ([], {"python_version": name}),
+                task_names=["3.7", "3.8"],
+            )
+        )
+        results.print_report()
+    ```
+
+    Failures are handled like `task_matrix` does: with `fail_fast` the tasks not yet launched are skipped after the
+    first failed one, or after `max_failures` failed ones if given, while with `cancel_running` the running hooks are
+    cancelled too (killing their commands, if launched by an async runner) and marked as cancelled. Reports can be
+    written to the `json_report` and `junit_report` paths.
+
+    It returns a TaskMatrix object. Tasks are always listed in the order their names were given.
+    """
+    reporters: List[MatrixReporter] = []
+    if json_report:
+        reporters.append(JsonLinesReporter(json_report))
+    if junit_report:
+        reporters.append(JUnitReporter(junit_report))
+
+    if fail_fast and max_failures is None:
+        max_failures = 1
+
+    tasks = [MatrixTask(name=name) for name in task_names]
+    futures: Dict["asyncio.Future[MatrixTask]", MatrixTask] = {}
+    cancelled: Set[str] = set()
+    semaphore = asyncio.Semaphore(max_concurrency or len(tasks) or 1)
+
+    async def run_task(task: MatrixTask) -> MatrixTask:
+        async with semaphore:
+            await _run_async_task(
+                tm, task, hook, hook_args_builder, print_steps, cancelled
+            )
+            # register the task before a waiting one takes its place, so that it's skipped if the matrix stopped
+            tm.register_task(task)
+            if tm.stopped and tm.cancel_running:
+                # hooks not launched yet will be skipped
+                for future, other in futures.items():
+                    if other.stats.started_at and not other.stats.ended_at:
+                        cancelled.add(other.name)
+                        future.cancel()
+        return task
+
+    with TaskMatrix.new(
+        quiet=not print_steps,
+        reporters=reporters,
+        max_failures=max_failures,
+        cancel_running=cancel_running,
+    ) as tm:
+        futures.update((asyncio.ensure_future(run_task(task)), task) for task in tasks)
+        try:
+            await asyncio.gather(*futures)
+        finally:
+            # the matrix itself may have been cancelled: do not leave hooks behind
+            for future in futures:
+                future.cancel()
+
+        # keep the tasks in the order they were given
+        tm.tasks = tasks
+        return tm
+
+
+async def _run_async_task(
+    tm: TaskMatrix,
+    task: MatrixTask,
+    hook: Callable[..., Awaitable[Any]],
+    hook_args_builder: Callable[[str], Tuple[List[Any], Dict[str, Any]]],
+    print_steps: bool,
+    cancelled: Set[str],
+) -> MatrixTask:
+    """Await the hook for the given task, updating its state and return value. It only raises if cancelled from the
+    outside, and not because of the matrix `cancel_running`."""
+    if tm.stopped:
+        # this task should not be launched, mark it as skipped
+        task.state = TaskState.SKIPPED
+        return task
+    task.stats.started_at = time.time()
+    start = time.perf_counter()
+    try:
+        hook_args, hook_kwargs = hook_args_builder(task.name)
+        if print_steps:
+            task.report_state()
+        task.returned = await hook(*hook_args, **hook_kwargs)
+        task.state = TaskState.OK
+        task.return_code = getattr(task.returned, "return_code", 0)
+    except asyncio.CancelledError:
+        if task.name not in cancelled:
+            raise
+        # cancelled because too many tasks failed
+        task.state = TaskState.CANCELLED
+    except Exception as e:
+        task.return_code = get_return_code(e)
+        task.error = describe_exception(e)
+        task.state = TaskState.FAILED
+    finally:
+        task.stats.ended_at = time.time()
+        task.stats.wall_time = time.perf_counter() - start
+    return task
+
+
+async def _read_stream(
+    stream: Optional[asyncio.StreamReader], output: Optional[IO[str]]
+) -> str:
+    """Read the stream until its end and return its content, copying it to `output` as it comes, if given."""
+    if stream is None:
+        return ""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    chunks = []
+    while True:
+        data = await stream.read(2**16)
+        text = decoder.decode(data, final=not data)
+        if text:
+            chunks.append(text)
+            if output:
+                output.write(text)
+                output.flush()
+        if not data:
+            return "".join(chunks)
@@ -0,0 +1,157 @@
+import fnmatch
+import json
+import os
+import subprocess
+import threading
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from invoke_poetry.poetry_api import PoetryAPI
+from invoke_poetry.settings import Settings
+from invoke_poetry.utils import get_callable_identity, get_files_hash, stable_repr
+
+#
+# ABOUT THIS MODULE
+#
+# An opt-in cache for task matrix results. Every entry gets a fingerprint built from its task name, its hook and the
+# hook args, the command line arguments passed after a '--', the content of the input files and the interpreter it
+# runs with. The fingerprint of the last OK run of every task name is stored on disk: when a later run computes the
+# same fingerprint, the task does not need to run again.
+#
+# Input files are, by default, all files tracked by git: new files count once added to the index, while untracked
+# ones (like local scratch files) must be opted in with glob patterns. The interpreter is the one of the project envs
+# whose names appear among the hook args (like a `python_version="3.8"` kwarg), or the active env one otherwise.
+#
+
+# The file, inside `Settings.state_path`, storing the fingerprints of OK results
+RESULT_CACHE_FILE = "matrix-cache.json"
+# The file, inside `Settings.state_path`, memoizing the digests of input files
+DIGESTS_MEMO_FILE = "digests.json"
+
+
+class ResultCache:
+    """The task matrix results cache. It's thread safe."""
+
+    def __init__(self, inputs: Optional[Iterable[str]] = None) -> None:
+        self.path = Settings.state_path / RESULT_CACHE_FILE
+        self.inputs = list(inputs) if inputs is not None else None
+        self._inputs_hash: Optional[str] = None
+        self._lock = threading.Lock()
+        try:
+            self._entries: Dict[str, str] = dict(json.loads(self.path.read_text()))
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get_fingerprint(
+        self,
+        name: str,
+        hook: Any,
+        hook_args: List[Any],
+        hook_kwargs: Dict[str, Any],
+    ) -> str:
+        """Return the fingerprint of a task matrix entry."""
+        from invoke_poetry.main import get_additional_args
+
+        with self._lock:
+            if self._inputs_hash is None:
+                self._inputs_hash = get_files_hash(
+                    get_input_files(self.inputs),
+                    memo_file=Settings.state_path / DIGESTS_MEMO_FILE,
+                )
+        fingerprint = sha256()
+        for part in [
+            name,
+            get_callable_identity(hook),
+            stable_repr(hook_args),
+            stable_repr(hook_kwargs),
+            # hooks may pass them on to their commands
+            stable_repr(get_additional_args()),
+            self._inputs_hash,
+            _get_interpreter_fingerprint([*hook_args, *hook_kwargs.values()]),
+        ]:
+            fingerprint.update(part.encode() + b"\0")
+        return fingerprint.hexdigest()
+
+    def is_cached(self, name: str, fingerprint: str) -> bool:
+        """Return True if the last OK run of the task had the same fingerprint."""
+        with self._lock:
+            return self._entries.get(name) == fingerprint
+
+    def store(self, name: str, fingerprint: str) -> None:
+        """Save the fingerprint of an OK run of the task."""
+        with self._lock:
+            self._entries[name] = fingerprint
+            self._save()
+
+    def discard(self, name: str) -> None:
+        """Forget the last OK run of the task."""
+        with self._lock:
+            if self._entries.pop(name, None):
+                self._save()
+
+    def _save(self) -> None:
+        """Atomically write the cache file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{threading.get_ident()}")
+        tmp_path.write_text(json.dumps(self._entries, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.path)
+
+
+def get_input_files(patterns: Optional[Iterable[str]] = None) -> List[Path]:
+    """Return the sorted list of files matching the given glob patterns, relative to the current folder.
+
+    Without patterns, return the files tracked by git (untracked files are left to explicit patterns); outside a git
+    repository, return all files skipping hidden folders and venvs. Files in `Settings.state_path` are never
+    returned."""
+    files: Iterable[Path]
+    if patterns is not None:
+        files = {
+            file
+            for pattern in patterns
+            for file in Path().glob(pattern)
+            if file.is_file()
+        }
+    else:
+        try:
+            output = subprocess.run(
+                ["git", "ls-files", "-z", "--cached"],
+                capture_output=True,
+                check=True,
+            ).stdout
+            files = [Path(name) for name in output.decode().split("\0") if name]
+        except (OSError, subprocess.CalledProcessError):
+            files = _walk_project()
+    state_path = Settings.state_path.absolute()
+    return sorted(file for file in files if state_path not in file.absolute().parents)
+
+
+def _walk_project() -> Iterable[Path]:
+    """Yield all project files, skipping hidden folders and venvs."""
+    for root, dirs, files in os.walk("."):
+        dirs[:] = [
+            d
+            for d in dirs
+            if not d.startswith(".") and not (Path(root, d, "pyvenv.cfg")).exists()
+        ]
+        for name in files:
+            if not fnmatch.fnmatch(name, "*.py[cod]"):
+                yield Path(root, name)
+
+
+def _get_interpreter_fingerprint(hook_args: List[Any]) -> str:
+    """Return a string identifying the interpreters of the envs named in the hook args, or of the active one."""
+    envs = [
+        path
+        for arg in hook_args
+        if isinstance(arg, str) and (path := PoetryAPI.get_env_path(arg))
+    ]
+    if not envs:
+        envs = [PoetryAPI.get_active_env_path()]
+    parts = []
+    for env in envs:
+        try:
+            parts.append((env / "pyvenv.cfg").read_text())
+        except OSError:
+            parts.append(str(env))
+    return "\0".join(parts)
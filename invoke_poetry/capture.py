@@ -0,0 +1,178 @@
+import re
+import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Deque, Dict, Generator, List, Optional
+
+from invoke.runners import Runner, normalize_hide
+
+from invoke_poetry.settings import Settings
+
+#
+# ABOUT THIS MODULE
+#
+# Per-task output capture for task matrices. While a task runs inside `capture_output`, everything its thread writes
+# on stdout and stderr, along with the output of the commands it launches with invoke, goes to its OutputCapture
+# instead of the terminal. Captured output is kept in memory up to a limit, then spilled to the task log file; the
+# last lines are also kept apart, so that the tail of a failed task can be shown without reading its log back.
+#
+# Since invoke copies the output of commands from its own I/O threads, which can't be told apart, invoke runners are
+# given the capture as their output streams when a command is launched. Processes writing straight to the terminal
+# file descriptors (like `os.system` ones) are not captured.
+#
+
+# The folder, inside `Settings.state_path`, holding the task logs
+LOGS_FOLDER = "logs"
+# The captured output kept in memory before spilling to the log file, in characters
+MEMORY_LIMIT = 2**20
+# The number of last output lines kept apart
+TAIL_LINES = 20
+
+
+class OutputCapture:
+    """A writable stream capturing the output of a task into the log file at `path`. It's thread safe."""
+
+    def __init__(
+        self, path: Path, memory_limit: int = MEMORY_LIMIT, tail_lines: int = TAIL_LINES
+    ) -> None:
+        self.path = path
+        self.memory_limit = memory_limit
+        self.tail_lines = tail_lines
+        self.tail: Deque[str] = deque(maxlen=tail_lines)
+        self._chunks: List[str] = []
+        self._size = 0
+        self._partial_line = ""
+        self._file: Optional[IO[str]] = None
+        self._written = False
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._written = self._written or bool(text)
+            lines = (self._partial_line + text).split("\n")
+            self._partial_line = lines.pop()
+            self.tail.extend(lines)
+            if self._file:
+                self._file.write(text)
+            else:
+                self._chunks.append(text)
+                self._size += len(text)
+                if self._size > self.memory_limit:
+                    self._spill()
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+    def get_tail(self) -> List[str]:
+        """Return the last captured lines."""
+        with self._lock:
+            tail = list(self.tail)
+            if self._partial_line:
+                tail.append(self._partial_line)
+            return tail[-self.tail_lines :]
+
+    def close(self) -> Optional[Path]:
+        """Write all captured output to the log file. Return its path, or None if nothing was captured."""
+        with self._lock:
+            if not self._written:
+                return None
+            if not self._file:
+                self._spill()
+            if self._file:
+                self._file.close()
+            return self.path
+
+    def _spill(self) -> None:
+        """Move the output kept in memory to the log file, where further output is written directly."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("w")
+        self._file.write("".join(self._chunks))
+        self._chunks, self._size = [], 0
+
+
+def get_log_path(task_name: str) -> Path:
+    """Return the log file path of the given task."""
+    file_name = re.sub(r"[^\w.-]", "_", task_name)
+    return Settings.state_path / LOGS_FOLDER / f"{file_name}.log"
+
+
+@contextmanager
+def capture_output(capture: OutputCapture) -> Generator[None, None, None]:
+    """Capture the output of the current thread, and of the commands it launches, in the code block."""
+    thread_id = threading.get_ident()
+    with _captures_lock:
+        if not _captures:
+            _install_stream_proxies()
+        _captures[thread_id] = capture
+    try:
+        yield
+    finally:
+        with _captures_lock:
+            del _captures[thread_id]
+            if not _captures:
+                _remove_stream_proxies()
+
+
+class _ThreadRoutingStream:
+    """A proxy of a standard stream writing to the capture of the current thread, if any."""
+
+    def __init__(self, stream: Any) -> None:
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        capture = _captures.get(threading.get_ident())
+        if capture is not None:
+            return capture.write(text)
+        return int(self.stream.write(text))
+
+    def flush(self) -> None:
+        if threading.get_ident() not in _captures:
+            self.stream.flush()
+
+    def isatty(self) -> bool:
+        if threading.get_ident() in _captures:
+            return False
+        return bool(self.stream.isatty())
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+_captures: Dict[int, OutputCapture] = {}
+_captures_lock = threading.Lock()
+_original_runner_run = Runner.run
+
+
+def _run(self: Runner, command: str, **kwargs: Any) -> Any:
+    capture = _captures.get(threading.get_ident())
+    if capture is not None:
+        # invoke shows hidden streams when they are given explicitly
+        hide = normalize_hide(kwargs.get("hide", self.context.config.run.hide))
+        for stream, name in [("out_stream", "stdout"), ("err_stream", "stderr")]:
+            if kwargs.get(stream) is None and name not in hide:
+                kwargs[stream] = capture
+    return _original_runner_run(self, command, **kwargs)
+
+
+def _install_stream_proxies() -> None:
+    """Route standard streams, and invoke runners output, to the capture of the writing thread."""
+    if not isinstance(sys.stdout, _ThreadRoutingStream):
+        sys.stdout = _ThreadRoutingStream(sys.stdout)  # type: ignore[assignment]
+    if not isinstance(sys.stderr, _ThreadRoutingStream):
+        sys.stderr = _ThreadRoutingStream(sys.stderr)  # type: ignore[assignment]
+    Runner.run = _run  # type: ignore[method-assign]
+
+
+def _remove_stream_proxies() -> None:
+    """Restore the standard streams and invoke runners."""
+    if isinstance(sys.stdout, _ThreadRoutingStream):
+        sys.stdout = sys.stdout.stream
+    if isinstance(sys.stderr, _ThreadRoutingStream):
+        sys.stderr = sys.stderr.stream
+    Runner.run = _original_runner_run  # type: ignore[method-assign]
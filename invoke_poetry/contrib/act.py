@@ -1,30 +1,53 @@
-import hashlib
+import json
+import math
+import os
+import time
 from pathlib import Path
-from typing import List, NamedTuple, Optional
+from typing import Dict, List, NamedTuple, Optional
 
 from invoke import Context  # type: ignore[attr-defined]
 
-from invoke_poetry.logs import Colors, error, info, warn
+from invoke_poetry.contrib.docker import DockerBackend, get_docker_backend
+from invoke_poetry.logs import Colors, echo, error, info, logger, warn
+from invoke_poetry.utils import get_files_hash
+
+# Where the cache images last use times are tracked, see `ActCachedJobController`
+DEFAULT_CACHE_INDEX_PATH = Path.home() / ".cache" / "invoke-poetry" / "act"
 
 
 class DockerCacheImage(NamedTuple):
-    lock_md5: str
+    lock_hash: str
     image_id: str
+    # in bytes, if known
+    size: Optional[int] = None
 
 
 class ActJobController:
-    """An interface to interact with docker container and images related to act."""
+    """An interface to interact with docker container and images related to act.
+
+    Docker is reached through the given `backend` or, by default, through the one picked by `get_docker_backend` on
+    first use: the Engine API over the docker unix socket when available, the docker CLI otherwise.
+    """
 
     job_file: Path
     act_dev_prefix: str
+    backend: Optional[DockerBackend]
 
     def __init__(
         self,
         job_file: Path,
         job_name: str,
+        backend: Optional[DockerBackend] = None,
     ) -> None:
         self.job_file = job_file
         self.act_dev_prefix = f"act-{job_file.stem}-{job_name}"
+        self.backend = backend
+
+    def get_backend(self, context: Context) -> DockerBackend:
+        """Return the docker backend, picking one if needed."""
+        if self.backend is None:
+            self.backend = get_docker_backend(context)
+        return self.backend
 
     def print_status(self, context: Context) -> None:
         """Print a report of all docker resources linked to this act job."""
@@ -35,12 +58,13 @@ class ActJobController:
     @staticmethod
     def _print_container_list(heading: str, containers: List[str]) -> None:
         """Print the given container id list."""
-        print(heading)
-        if containers:
-            for container_id in containers:
-                print(f"\t{container_id}")
-        else:
-            print(f"\t{Colors.FAIL}none{Colors.ENDC}")
+        with logger.batch():
+            echo(heading)
+            if containers:
+                for container_id in containers:
+                    echo(f"\t{container_id}")
+            else:
+                echo(f"\t{Colors.FAIL}none{Colors.ENDC}")
 
     def list_job_container_ids(self, c: Context) -> List[str]:
         """Return a list of ids of containers whose name starts with `self.act_dev_prefix`."""
@@ -51,43 +75,19 @@ class ActJobController:
         container ids."""
         return self.delete_containers(c, self.list_job_container_ids(c))
 
-    @staticmethod
-    def list_container_ids(c: Context, filter_with: str) -> List[str]:
-        """Filter containers using the given `search` string and return a list of corresponding ids."""
-        ids = []
-        result = c.run(f"docker ps -a | grep '{filter_with}'", hide=True, warn=True)
-        if result:
-            for line in (line for line in result.stdout.split("\n") if len(line) > 0):
-                ids.append(line.split(" ")[0])
-            return ids
-        else:
-            return ids
+    def list_container_ids(self, c: Context, filter_with: str) -> List[str]:
+        """Return a list of ids of containers whose name starts with the given `filter_with` string."""
+        return self.get_backend(c).list_container_ids(filter_with)
 
     def delete_containers(
         self, context: Context, container_list: List[str]
     ) -> List[str]:
         """Delete containers based on the given ids. Return a list of deleted container ids."""
-        return self._delete(
-            context=context, delete_command="docker rm -f", entry_ids=container_list
-        )
+        return self.get_backend(context).delete_containers(container_list)
 
     def delete_images(self, context: Context, image_ids: List[str]) -> List[str]:
         """Delete images based on the given ids. Return a list of deleted image ids."""
-        return self._delete(
-            context=context, delete_command="docker rmi", entry_ids=image_ids
-        )
-
-    @staticmethod
-    def _delete(
-        context: Context, delete_command: str, entry_ids: List[str]
-    ) -> List[str]:
-        """TODO"""
-        deleted = []
-        for entry_id in entry_ids:
-            result = context.run(f"{delete_command} {entry_id}", pty=True, hide=True)
-            if result and result.return_code == 0:
-                deleted.append(result.stdout.rstrip("\r").rstrip("\n"))
-        return deleted
+        return self.get_backend(context).delete_images(image_ids)
 
     def open_shell_in_job_container(
         self, context: Context, env_file: Optional[str] = None
@@ -113,12 +113,28 @@ class ActJobController:
 
 
 class ActCachedJobController(ActJobController):
-    """TODO"""
+    """An act job controller which runs the job in a container built from a cache image, with all project
+    dependencies already installed. Cache images are identified by the hash of the lock file and of the cache job
+    file.
+
+    Up to `cache_retention` cache images are kept, evicting the least recently used ones; if `max_cache_size` is given
+    (in bytes), older images are evicted as well until the retained ones fit in it. The image needed by the current
+    lock file is never evicted. Last use times are tracked in an index file in `cache_index_path`.
+
+    Cache images are keyed on the content of the files matching the `cache_inputs` glob patterns (by default the
+    poetry lock, the pyproject and the cache job file). Their digests are memoized in `cache_index_path` too, so that
+    unchanged files are not read again.
+    """
 
     cache_file: Path
     act_cache_prefix: str
     docker_base_tag: str
     docker_cache_tag_prefix: str
+    cache_retention: int
+    max_cache_size: Optional[int]
+    cache_index_file: Path
+    cache_inputs: List[str]
+    digests_memo_file: Path
 
     def __init__(
         self,
@@ -128,15 +144,29 @@ class ActCachedJobController(ActJobController):
         cache_job_name: str,
         docker_base_tag: str,
         docker_cache_tag_prefix: str,
+        backend: Optional[DockerBackend] = None,
+        cache_retention: int = 1,
+        max_cache_size: Optional[int] = None,
+        cache_index_path: Path = DEFAULT_CACHE_INDEX_PATH,
+        cache_inputs: Optional[List[str]] = None,
     ) -> None:
-        """TODO"""
-        super().__init__(job_file=job_file, job_name=job_name)
+        super().__init__(job_file=job_file, job_name=job_name, backend=backend)
         self.cache_file = cache_file
         self.act_cache_prefix = f"act-{cache_file.stem}-{cache_job_name}"
         self.docker_base_tag = docker_base_tag
         self.docker_cache_tag_prefix = (
             f"{docker_cache_tag_prefix}-{self.act_dev_prefix[4:]}"
         )
+        self.cache_retention = max(cache_retention, 1)
+        self.max_cache_size = max_cache_size
+        index_name = self.docker_cache_tag_prefix.replace("/", "_")
+        self.cache_index_file = cache_index_path / f"{index_name}.json"
+        self.digests_memo_file = cache_index_path / f"{index_name}.digests.json"
+        self.cache_inputs = cache_inputs or [
+            "poetry.lock",
+            "pyproject.toml",
+            str(cache_file),
+        ]
 
     def list_cache_container_ids(self, c: Context) -> List[str]:
         """Return a list of ids of containers whose name starts with `self.act_cache_prefix`."""
@@ -157,7 +187,8 @@ class ActCachedJobController(ActJobController):
     def get_cache_image(
         self, build_command: str, context: Context, force_rebuild: bool = False
     ) -> str:
-        """TODO"""
+        """Return the tag of the cache image for the current lock file, building it with `build_command` if needed.
+        Old cache images are evicted following the retention policy."""
         # Recover existing cache images
         existing_cache_images = self.list_cache_images(context)
 
@@ -170,9 +201,9 @@ class ActCachedJobController(ActJobController):
             )
             existing_cache_images = []
 
-        lock_hash = self._get_cumulative_hash([Path("poetry.lock"), self.cache_file])
+        lock_hash = self.get_cache_key()
 
-        if lock_hash not in (image.lock_md5 for image in existing_cache_images):
+        if lock_hash not in (image.lock_hash for image in existing_cache_images):
             if not force_rebuild:
                 warn("Cache image not found!")
             # Create the new cache image
@@ -181,18 +212,68 @@ class ActCachedJobController(ActJobController):
                 context=context,
                 lock_hash=lock_hash,
             )
+            # Account for the new image size
+            if self.max_cache_size is not None:
+                existing_cache_images = self.list_cache_images(context)
         else:
-            # Make sure the up-to-date image does not get deleted
-            existing_cache_images = [
-                image for image in existing_cache_images if image.lock_md5 != lock_hash
-            ]
             cache_tag = self._get_cache_tag(lock_hash)
 
         # delete old cache images
-        self.delete_images(context, [image.image_id for image in existing_cache_images])
+        self._mark_cache_image_used(lock_hash)
+        self.delete_images(
+            context,
+            [
+                image.image_id
+                for image in self._get_evicted_cache_images(
+                    existing_cache_images, lock_hash
+                )
+            ],
+        )
         info("Cache image ready!")
         return cache_tag
 
+    def _get_evicted_cache_images(
+        self, images: List[DockerCacheImage], lock_hash: str
+    ) -> List[DockerCacheImage]:
+        """Return the cache images exceeding the retention policy, least recently used first being evicted. The
+        image for the given lock hash is never evicted."""
+        last_used = self._load_cache_index()
+        budget = math.inf if self.max_cache_size is None else self.max_cache_size
+        for image in images:
+            if image.lock_hash == lock_hash:
+                budget -= image.size or 0
+        # most recently used first
+        candidates = sorted(
+            (image for image in images if image.lock_hash != lock_hash),
+            key=lambda image: last_used.get(image.lock_hash, 0),
+            reverse=True,
+        )
+        for kept, image in enumerate(candidates):
+            if kept + 1 >= self.cache_retention:
+                return candidates[kept:]
+            budget -= image.size or 0
+            if budget < 0:
+                return candidates[kept:]
+        return []
+
+    def _load_cache_index(self) -> Dict[str, float]:
+        """Return the last use times of cache images, by lock hash."""
+        try:
+            return dict(json.loads(self.cache_index_file.read_text()))
+        except (OSError, ValueError):
+            return {}
+
+    def _mark_cache_image_used(self, lock_hash: str) -> None:
+        """Record the cache image for the given lock hash as used now."""
+        index = self._load_cache_index()
+        index[lock_hash] = time.time()
+        # keep the index small, since evicted images are gone anyway
+        index = dict(sorted(index.items(), key=lambda item: item[1])[-100:])
+        self.cache_index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_index_file.with_name(f".{self.cache_index_file.name}.tmp")
+        tmp_file.write_text(json.dumps(index, indent=2))
+        os.replace(tmp_file, self.cache_index_file)
+
     def _get_cache_tag(self, lock_hash: str) -> str:
         """TODO"""
         return f"{self.docker_cache_tag_prefix}-{lock_hash}"
@@ -213,49 +294,48 @@ class ActCachedJobController(ActJobController):
         cache_containers = self.list_cache_container_ids(context)
         cache_tag = self._get_cache_tag(lock_hash)
         if cache_containers:
-            context.run(
-                f"docker commit {cache_containers[0]} {cache_tag}",
-                hide=False,
-            )
+            self.get_backend(context).commit(cache_containers[0], cache_tag)
         # Delete the cache container
         info("Cleaning up...")
         self.delete_cache_containers(context)
         return cache_tag
 
     def list_cache_images(self, context: Context) -> List[DockerCacheImage]:
-        """TODO"""
-        images = []
-        result = context.run(
-            f"docker images --all | grep '{self.docker_cache_tag_prefix}'",
-            hide=True,
-            warn=True,
-        )
-        if result:
-            for line in (line for line in result.stdout.split("\n") if len(line) > 0):
-                data = [el for el in line.split(" ") if len(el) > 0]
-                md5_hash = data[0].replace(f"{self.docker_cache_tag_prefix}-", "")
-                images.append(
-                    DockerCacheImage(
-                        lock_md5=md5_hash,
-                        image_id=data[2],
-                    )
-                )
-            return images
-        else:
-            return images
+        """Return a list of all cache images, whose repository name starts with `self.docker_cache_tag_prefix`."""
+        return [
+            DockerCacheImage(
+                lock_hash=image.repository[len(self.docker_cache_tag_prefix) + 1 :],
+                image_id=image.image_id,
+                size=image.size,
+            )
+            for image in self.get_backend(context).list_images(
+                f"{self.docker_cache_tag_prefix}-*"
+            )
+        ]
+
+    def get_cache_key(self) -> str:
+        """Return a hash of the content of all files matching the `cache_inputs` patterns."""
+        files: List[Path] = []
+        for pattern in self.cache_inputs:
+            if any(char in pattern for char in "*?["):
+                files.extend(self._glob(pattern))
+            elif Path(pattern).is_file():
+                # a plain path, possibly absolute
+                files.append(Path(pattern))
+            else:
+                error(f"Could not find `{pattern}`!")
+        return get_files_hash(files, memo_file=self.digests_memo_file)
 
     @staticmethod
-    def _get_cumulative_hash(files: List[Path]) -> str:
-        """Return a md5 hashsum based on the given files."""
-        hash_md5 = hashlib.md5()
-        for lock_file in files:
-            if not lock_file.is_file():
-                error(f"Could not find `{lock_file}`!")
-            with open(lock_file, "rb") as file_reader:
-                for chunk in iter(lambda: file_reader.read(4096), b""):
-                    # Read the file chunk by chunk and keep updating the hash
-                    hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+    def _glob(pattern: str) -> List[Path]:
+        """Return the sorted list of files matching the given glob pattern. Absolute patterns are matched from their
+        anchor, since `Path.glob` only takes relative ones."""
+        path = Path(pattern)
+        root = Path(path.anchor) if path.is_absolute() else Path()
+        relative_pattern = (
+            str(path.relative_to(root)) if path.is_absolute() else pattern
+        )
+        return sorted(file for file in root.glob(relative_pattern) if file.is_file())
 
     def print_status(self, context: Context) -> None:
         """Print a report of all the resources linked to this cached act job."""
@@ -264,12 +344,13 @@ class ActCachedJobController(ActJobController):
             "Act Job Cache containers:", self.list_cache_container_ids(context)
         )
         images = self.list_cache_images(context)
-        print("Act Job Cache images:")
-        if images:
-            for image in images:
-                print(f"\t{image.image_id} (from lock hash {image.lock_md5})")
-        else:
-            print(f"\t{Colors.FAIL}none{Colors.ENDC}")
+        with logger.batch():
+            echo("Act Job Cache images:")
+            if images:
+                for image in images:
+                    echo(f"\t{image.image_id} (from lock hash {image.lock_hash})")
+            else:
+                echo(f"\t{Colors.FAIL}none{Colors.ENDC}")
 
     def open_shell_in_cache_container(
         self, context: Context, env_file: Optional[str] = None
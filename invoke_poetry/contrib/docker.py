@@ -0,0 +1,304 @@
+import http.client
+import json
+import os
+import re
+import socket
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from invoke import Context  # type: ignore[attr-defined]
+
+#
+# ABOUT THIS MODULE
+#
+# Docker backends used by the act contrib module to manage containers and images. The CLI backend spawns a docker
+# process for every operation and parses its output, while the socket backend talks to the Docker Engine HTTP API
+# over a single persistent unix socket connection, exchanging JSON. `get_docker_backend` picks the socket backend if
+# the docker daemon is reachable through it, falling back to the CLI.
+#
+# Interactive operations (like opening a shell in a container) always need the CLI.
+#
+
+DEFAULT_DOCKER_SOCKET = Path("/var/run/docker.sock")
+
+# Requests that can be safely sent again if the connection drops before their response
+IDEMPOTENT_METHODS = {"GET", "DELETE"}
+
+
+class DockerImage(NamedTuple):
+    repository: str
+    image_id: str
+    # in bytes, if known
+    size: Optional[int] = None
+
+
+class DockerBackendError(Exception):
+    """Raised when the docker backend can't complete an operation."""
+
+
+class DockerBackend(ABC):
+    """Base class of the docker backends. Container and image ids are short (12 chars) ones, like the CLI shows."""
+
+    @abstractmethod
+    def list_container_ids(self, name_prefix: str) -> List[str]:
+        """Return a list of ids of all containers whose name starts with `name_prefix`."""
+
+    @abstractmethod
+    def list_images(self, reference: str) -> List[DockerImage]:
+        """Return all images matching the given `reference` pattern (e.g. 'repo-*')."""
+
+    @abstractmethod
+    def delete_containers(self, container_ids: List[str]) -> List[str]:
+        """Forcibly delete the given containers. Return a list of deleted container ids."""
+
+    @abstractmethod
+    def delete_images(self, image_ids: List[str]) -> List[str]:
+        """Delete the given images. Return a list of deleted image ids."""
+
+    @abstractmethod
+    def commit(self, container_id: str, tag: str) -> None:
+        """Create a new image, tagged `tag`, from the given container."""
+
+
+class DockerCliBackend(DockerBackend):
+    """A backend spawning the docker CLI."""
+
+    def __init__(self, context: Context) -> None:
+        self.context = context
+
+    def list_container_ids(self, name_prefix: str) -> List[str]:
+        result = self.context.run(
+            f"docker ps --all --filter 'name=^/?{name_prefix}' --format '{{{{.ID}}}}'",
+            hide=True,
+            warn=True,
+        )
+        if result and result.ok:
+            return [line for line in result.stdout.splitlines() if line]
+        return []
+
+    def list_images(self, reference: str) -> List[DockerImage]:
+        result = self.context.run(
+            f"docker images --all --filter 'reference={reference}' "
+            "--format '{{.Repository}} {{.ID}} {{.Size}}'",
+            hide=True,
+            warn=True,
+        )
+        images = []
+        if result and result.ok:
+            for line in (line for line in result.stdout.splitlines() if line):
+                repository, image_id, size = line.split(" ")
+                images.append(DockerImage(repository, image_id, _parse_size(size)))
+        return images
+
+    def delete_containers(self, container_ids: List[str]) -> List[str]:
+        return self._delete("docker rm -f", "docker ps --all --quiet", container_ids)
+
+    def delete_images(self, image_ids: List[str]) -> List[str]:
+        return self._delete("docker rmi", "docker images --all --quiet", image_ids)
+
+    def commit(self, container_id: str, tag: str) -> None:
+        self.context.run(f"docker commit {container_id} {tag}", hide=False)
+
+    def _delete(
+        self, delete_command: str, list_command: str, entry_ids: List[str]
+    ) -> List[str]:
+        """Delete all given entries with a single `delete_command` invocation. Return a list of deleted entry ids.
+
+        If only some of them could be deleted, the deleted ones are the ones missing from the `list_command` output
+        (listing the ids of all entries) afterwards."""
+        entry_ids = list(dict.fromkeys(entry_ids))
+        if not entry_ids:
+            return []
+        result = self.context.run(
+            f"{delete_command} {' '.join(entry_ids)}", hide=True, warn=True
+        )
+        if result is None:
+            return []
+        if result.ok:
+            return entry_ids
+        # docker keeps going when an entry can't be deleted: look for the ones still there
+        result = self.context.run(list_command, hide=True, warn=True)
+        if not (result and result.ok):
+            return []
+        remaining = [_short_id(line) for line in result.stdout.split()]
+        return [
+            entry_id
+            for entry_id in entry_ids
+            if not any(i.startswith(_short_id(entry_id)) for i in remaining)
+        ]
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection over a unix socket."""
+
+    def __init__(self, socket_path: Path, timeout: Optional[float]) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(str(self.socket_path))
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class DockerSocketBackend(DockerBackend):
+    """A backend talking to the Docker Engine API through its unix socket. The connection is kept open between
+    requests and it's thread safe.
+
+    Requests time out after `timeout` seconds, except for the ones that may take long, like commits, which never time
+    out."""
+
+    def __init__(
+        self, socket_path: Path = DEFAULT_DOCKER_SOCKET, timeout: float = 60
+    ) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._connection = _UnixHTTPConnection(socket_path, timeout)
+        self._lock = threading.Lock()
+
+    def ping(self) -> bool:
+        """Return True if the docker daemon answers."""
+        try:
+            return self._request("GET", "/_ping")[0] == 200
+        except (OSError, http.client.HTTPException):
+            return False
+
+    def list_container_ids(self, name_prefix: str) -> List[str]:
+        containers = self._get_json(
+            "/containers/json",
+            all=1,
+            filters=json.dumps({"name": [f"^/?{name_prefix}"]}),
+        )
+        return [_short_id(container["Id"]) for container in containers]
+
+    def list_images(self, reference: str) -> List[DockerImage]:
+        images = self._get_json(
+            "/images/json", all=1, filters=json.dumps({"reference": [reference]})
+        )
+        return [
+            DockerImage(
+                repository=repo_tag.rsplit(":", 1)[0],
+                image_id=image_id,
+                size=image.get("Size"),
+            )
+            for image in images
+            for image_id in [_short_id(image["Id"])]
+            # untagged images can't match a reference filter, the CLI lists one line for each tag
+            for repo_tag in image.get("RepoTags") or []
+        ]
+
+    def delete_containers(self, container_ids: List[str]) -> List[str]:
+        return self._delete("/containers/{}?force=1", container_ids)
+
+    def delete_images(self, image_ids: List[str]) -> List[str]:
+        return self._delete("/images/{}", image_ids)
+
+    def commit(self, container_id: str, tag: str) -> None:
+        repo, _, version = tag.rpartition(":")
+        if not repo or "/" in version:
+            # no explicit tag, the colon (if any) belongs to a registry host
+            repo, version = tag, "latest"
+        params = {"container": container_id, "repo": repo, "tag": version}
+        status, body = self._request("POST", f"/commit?{urlencode(params)}", slow=True)
+        if status >= 300:
+            raise DockerBackendError(
+                f"Could not commit container {container_id}: {body.decode()}"
+            )
+
+    def close(self) -> None:
+        """Close the connection to the docker daemon."""
+        with self._lock:
+            self._connection.close()
+
+    def _delete(self, url_template: str, entry_ids: List[str]) -> List[str]:
+        """Send a DELETE request for every entry. Return a list of deleted entry ids."""
+        return [
+            entry_id
+            for entry_id in dict.fromkeys(entry_ids)
+            if self._request("DELETE", url_template.format(quote(entry_id)))[0] < 300
+        ]
+
+    def _get_json(self, path: str, **params: Any) -> List[Dict[str, Any]]:
+        """Send a GET request and return the decoded JSON response."""
+        status, body = self._request("GET", f"{path}?{urlencode(params)}")
+        if status >= 300:
+            raise DockerBackendError(f"GET {path} failed: {body.decode()}")
+        return list(json.loads(body))
+
+    def _request(self, method: str, url: str, slow: bool = False) -> Tuple[int, bytes]:
+        """Send a request and return the response status and body. `slow` requests never time out.
+
+        If the daemon closed the kept alive connection, the request is sent again on a new one, unless it may have
+        been processed already and it's not idempotent."""
+        with self._lock:
+            self._set_timeout(None if slow else self.timeout)
+            try:
+                self._send(method, url)
+            except ConnectionError:
+                # nothing reached the daemon
+                self._connection.close()
+                self._send(method, url)
+            try:
+                return self._receive()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                self._connection.close()
+                if method not in IDEMPOTENT_METHODS:
+                    raise
+                self._send(method, url)
+                return self._receive()
+
+    def _set_timeout(self, timeout: Optional[float]) -> None:
+        """Set the timeout of the next requests."""
+        self._connection.timeout = timeout
+        if self._connection.sock:
+            self._connection.sock.settimeout(timeout)
+
+    def _send(self, method: str, url: str) -> None:
+        self._connection.request(method, url)
+
+    def _receive(self) -> Tuple[int, bytes]:
+        response = self._connection.getresponse()
+        return response.status, response.read()
+
+
+def get_docker_backend(
+    context: Context, socket_path: Optional[Path] = None
+) -> DockerBackend:
+    """Return a socket backend if the docker daemon answers on its unix socket, a CLI backend otherwise."""
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if socket_path is None:
+        if docker_host and not docker_host.startswith("unix://"):
+            # a remote daemon: leave it to the CLI
+            return DockerCliBackend(context)
+        socket_path = (
+            Path(docker_host[len("unix://") :])
+            if docker_host
+            else DEFAULT_DOCKER_SOCKET
+        )
+    if socket_path.exists():
+        backend = DockerSocketBackend(socket_path)
+        if backend.ping():
+            return backend
+        backend.close()
+    return DockerCliBackend(context)
+
+
+def _short_id(docker_id: str) -> str:
+    """Return the short version of a container or image id."""
+    return docker_id.split(":")[-1][:12]
+
+
+def _parse_size(size: str) -> Optional[int]:
+    """Parse a size as printed by the docker CLI (e.g. '1.23GB', using decimal units) into bytes."""
+    match = re.fullmatch(r"([\d.]+)\s*([kKMGTP]?)B", size)
+    if not match:
+        return None
+    return int(float(match[1]) * 1000 ** " KMGTP".index(match[2].upper() or " "))
@@ -1,14 +1,16 @@
 import os
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Generator, List, Optional
+from typing import Dict, Generator, List, Optional
 
 from invoke import Collection, Context  # type: ignore[attr-defined]
+from invoke.exceptions import UnexpectedExit
 
 from invoke_poetry.decorator import CollectionDecorator
-from invoke_poetry.logs import Colors, error, info, ok, warn
+from invoke_poetry.logs import Colors, echo, error, info, ok, warn
 from invoke_poetry.poetry_api import PoetryAPI
 from invoke_poetry.settings import Settings
+from invoke_poetry.templates import clone_template, get_template_key, save_template
 from invoke_poetry.utils import delay_keyboard_interrupt, natural_sort_key
 
 #
@@ -27,15 +29,41 @@ def env_activate(python_version: str, link: bool = True) -> None:
         Settings.venv_link_path.symlink_to(venv_path)
 
 
+def env_get_path(python_version: str, quiet: bool = True) -> Path:
+    """Return the path of the poetry env for the given version, creating it if needed. The active env is never
+    changed."""
+    venv_path = PoetryAPI.get_env_path(python_version)
+    if not venv_path:
+        try:
+            venv_path = PoetryAPI.create_env(python_version)
+        except ValueError as e:
+            error(str(e))
+            raise
+        if not quiet:
+            info(f"Created env: {python_version}")
+    return venv_path
+
+
 def env_init(
-    c: Context, python_version: str, link: bool = True, rebuild: bool = False
+    c: Context,
+    python_version: str,
+    link: bool = True,
+    rebuild: bool = False,
+    template: bool = False,
+    force: bool = False,
 ) -> None:
-    """Create a poetry env, installing all project dependencies. If needed, it can rebuild said env."""
+    """Create a poetry env, installing all project dependencies. If needed, it can rebuild said env. The installation
+    is skipped if already done with the current project state, unless `force` is True.
+
+    If `template` is True, a missing env is cloned from a matching template, if available, and the installed env is
+    saved as a template for later use."""
 
     # Delete an existing env if a rebuilt is needed
     if rebuild and PoetryAPI.is_env_available(python_version):
         env_remove(python_version, quiet=False, rm_link=False)
 
+    template_key = env_clone_template_if_possible(python_version) if template else None
+
     info(f"Activating {python_version} env.")
     env_activate(python_version, link)
 
@@ -45,7 +73,85 @@ def env_init(
     # import here to avoid circular import
     from invoke_poetry.main import install_project_dependencies
 
-    install_project_dependencies(c, quiet=False)
+    venv_path = PoetryAPI.get_active_env_path()
+    install_project_dependencies(
+        c, quiet=False, venv_path=venv_path, skip_unchanged=not force
+    )
+
+    if template_key and save_template(venv_path, template_key):
+        info(f"Env {python_version} saved as template.")
+
+
+def env_init_direct(
+    c: Context, python_version: str, template: bool = False, force: bool = False
+) -> None:
+    """Create a poetry env and install all project dependencies in it, without ever activating it. Since no global
+    poetry state is touched, it can be used concurrently for different versions (when run by a task matrix, log
+    lines are prefixed with the version)."""
+    template_key = env_clone_template_if_possible(python_version) if template else None
+    venv_path = env_get_path(python_version)
+
+    info("Installing project dependencies.")
+
+    # import here to avoid circular import
+    from invoke_poetry.main import install_project_dependencies
+
+    try:
+        install_project_dependencies(
+            venv_context(c, venv_path, nested_poetry=True),
+            quiet=True,
+            venv_path=venv_path,
+            skip_unchanged=not force,
+        )
+    except UnexpectedExit as e:
+        # the output was hidden, show it now since the installation failed
+        for line in (e.result.stdout + e.result.stderr).splitlines():
+            error(line, exit_now=False)
+        raise
+    if template_key and save_template(venv_path, template_key):
+        info("Env saved as template.")
+    ok("Env ready.")
+
+
+def env_clone_template_if_possible(python_version: str) -> Optional[str]:
+    """If the env for the given version does not exist, try to clone it from a matching template. Return the template
+    key, if a suitable interpreter is available."""
+    template_key = get_template_key(python_version)
+    if template_key and not PoetryAPI.is_env_available(python_version):
+        if clone_template(template_key, PoetryAPI.get_new_env_path(python_version)):
+            info(f"Env {python_version} cloned from template.")
+    return template_key
+
+
+def env_init_parallel(
+    c: Context,
+    versions: List[str],
+    rebuild: bool = False,
+    template: bool = False,
+    force: bool = False,
+) -> bool:
+    """Create and populate the poetry envs for all given versions concurrently, then print a summary report. Return
+    True if all envs were successfully initialized."""
+    if rebuild:
+        # removing an env could rewrite poetry envs.toml: do it sequentially before starting
+        for version in versions:
+            if PoetryAPI.is_env_available(version):
+                env_remove(version, quiet=False, rm_link=False)
+
+    # import here to avoid circular import
+    from invoke_poetry.matrix import TaskState, task_matrix
+
+    results = task_matrix(
+        hook=env_init_direct,
+        hook_args_builder=lambda version: (
+            [c, version],
+            {"template": template, "force": force},
+        ),
+        task_names=versions,
+        parallel=True,
+    )
+    results.print_report()
+    return all(task.state == TaskState.OK for task in results.tasks)
 
 
 def env_remove(version: str, quiet: bool = False, rm_link: bool = True) -> None:
@@ -95,6 +201,35 @@ def validate_env_version(python_version: Optional[str]) -> str:
     return python_version
 
 
+def get_venv_environ(venv_path: Path, nested_poetry: bool = False) -> Dict[str, str]:
+    """Return a copy of the current environment, modified to run commands inside the given venv as if it was activated.
+    It mirrors what `poetry run` does, so that commands see no difference.
+
+    With `nested_poetry`, poetry commands target the venv as well, but lose sight of all other project envs: it's
+    meant for the installation of the project dependencies only."""
+    environ = {
+        key: value
+        for key, value in os.environ.items()
+        if key not in ("PYTHONHOME", "__PYVENV_LAUNCHER__")
+    }
+    environ["VIRTUAL_ENV"] = str(venv_path)
+    environ["PATH"] = os.pathsep.join([str(venv_path / "bin"), environ.get("PATH", "")])
+    if nested_poetry:
+        # Poetry only honors VIRTUAL_ENV when the project is not found in the envs.toml file that lives in its
+        # virtualenvs path: point it somewhere without one, so that nested poetry commands target this venv too
+        environ["POETRY_VIRTUALENVS_PATH"] = str(venv_path)
+    return environ
+
+
+def venv_context(c: Context, venv_path: Path, nested_poetry: bool = False) -> Context:
+    """Return a copy of the given context whose `run` launches every command inside the given venv, see
+    `get_venv_environ`."""
+    config = c.config.clone()
+    config.run.env = get_venv_environ(venv_path, nested_poetry)
+    config.run.replace_env = True
+    return Context(config=config)
+
+
 @contextmanager
 def active_env(
     python_version: str,
@@ -189,7 +324,7 @@ def env_list_task(_: Context) -> None:
     """Show all associated venv and the active one."""
     info("Poetry virtual environments:")
     for version in env_get_list():
-        print(version)
+        echo(version)
 
 
 @env_task(
@@ -238,6 +373,9 @@ def env_remove_task(
         "all": "init all supported venv instead of a specific version",
         "link": "link the venv to '~/.venv'. Default: True",
         "rebuild": "recreate existing venvs. Default: False",
+        "parallel": "with --all, create and install all venvs concurrently. Default: False",
+        "template": "clone venvs from matching templates and save installed ones as templates. Default: False",
+        "force": "install the project dependencies even if already up to date. Default: False",
     },
 )
 def env_init_task(
@@ -246,15 +384,26 @@ def env_init_task(
     link: bool = True,
     all: bool = False,
     rebuild: bool = False,
+    parallel: bool = False,
+    template: bool = False,
+    force: bool = False,
 ) -> None:
     """Create a venv and install the project dependencies using a customizable hook.
 
-    By default, the hook run 'poetry install' inside the venv."""
+    By default, the hook run 'poetry install' inside the venv. With '--template', venvs are cloned from a snapshot of
+    an identical venv (same interpreter, lock file and hook), when available. The installation is skipped if nothing
+    changed since the last one in the venv, unless '--force' is used."""
     with remember_active_env(quiet=False):
-        if all:
+        if all and parallel:
+            versions = list(Settings().supported_python_versions)
+            if not env_init_parallel(c, versions, rebuild, template, force):
+                error("Could not initialize all envs!")
+            # end up in the same state a sequential init would leave
+            env_activate(versions[0], link)
+        elif all:
             for version in reversed(list(Settings().supported_python_versions)):
-                env_init(c, version, link, rebuild)
+                env_init(c, version, link, rebuild, template, force)
         else:
             python_version = validate_env_version(python_version)
-            env_init(c, python_version, link, rebuild)
+            env_init(c, python_version, link, rebuild, template, force)
     ok("Done")
@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from invoke_poetry.settings import Settings
+
+#
+# ABOUT THIS MODULE
+#
+# The durations of past task matrix runs. Task matrices with history enabled record how long every successful task
+# took and use those durations to launch the longest tasks first, so that a slow task does not end up stretching the
+# run because it was launched last. Matrix builders can use them to balance shards by expected time.
+#
+# Durations are smoothed with an exponential moving average, so that a single unusually slow or fast run does not
+# upset the schedule. When shards are balanced on several CI machines, all machines must share the same history file
+# (e.g. by restoring it from the CI cache), or they would not agree on the split.
+#
+
+# The file, inside `Settings.state_path`, storing the durations of past task runs
+DURATIONS_FILE = "durations.json"
+
+# The weight of the latest duration in the moving average
+SMOOTHING = 0.5
+
+
+class DurationHistory:
+    """The expected durations of tasks, in seconds, by task name. It's thread safe."""
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or Settings.state_path / DURATIONS_FILE
+        self._changed = False
+        self._lock = threading.Lock()
+        try:
+            self._durations: Dict[str, float] = {
+                str(name): float(duration)
+                for name, duration in json.loads(self.path.read_text()).items()
+            }
+        except (OSError, ValueError, AttributeError):
+            self._durations = {}
+
+    def get(self, name: str) -> Optional[float]:
+        """Return the expected duration of the task, if it ever ran."""
+        with self._lock:
+            return self._durations.get(name)
+
+    def get_durations(self, names: Iterable[str]) -> Dict[str, float]:
+        """Return the expected durations of the given tasks. Tasks that never ran are expected to last as long as the
+        average known task (or zero, if none ever ran)."""
+        names = list(names)
+        with self._lock:
+            known = [self._durations[name] for name in names if name in self._durations]
+            default = sum(known) / len(known) if known else 0.0
+            return {name: self._durations.get(name, default) for name in names}
+
+    def sort_longest_first(self, names: Iterable[str]) -> List[str]:
+        """Return the given task names sorted by decreasing expected duration. Ties keep their order."""
+        durations = self.get_durations(names)
+        return sorted(durations, key=lambda name: -durations[name])
+
+    def record(self, name: str, duration: float) -> None:
+        """Record a new duration of the task."""
+        with self._lock:
+            previous = self._durations.get(name)
+            if previous is not None:
+                duration = SMOOTHING * duration + (1 - SMOOTHING) * previous
+            self._durations[name] = duration
+            self._changed = True
+
+    def save(self) -> None:
+        """Atomically write the history file, if any duration has been recorded."""
+        with self._lock:
+            if not self._changed:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f".{self.path.name}.{threading.get_ident()}")
+            tmp_path.write_text(json.dumps(self._durations, indent=2, sort_keys=True))
+            os.replace(tmp_path, self.path)
+            self._changed = False
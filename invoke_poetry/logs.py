@@ -1,4 +1,27 @@
-# TODO docs
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Dict, Generator, List, Optional
+
+#
+# ABOUT THIS MODULE
+#
+# All invoke_poetry messages go through a module-wide `Logger`, by means of the `ok`, `info`, `warn`, `error` and
+# `echo` functions. The logger:
+#
+# - writes every line to its sink (stdout by default) with a single write, so that lines logged by concurrent threads
+#   never get mixed up; multiple lines can be batched in a single write with `logger.batch()`;
+# - prefixes lines with the name of the task set with `logger.task_prefix()` in the current thread (task matrices
+#   running in parallel do this);
+# - strips colors when the NO_COLOR environment variable is set or when the sink is not a terminal (FORCE_COLOR
+#   forces them);
+# - writes JSON lines instead of text if configured with `configure_logging(json_lines=True)` or if the
+#   INVOKE_POETRY_LOG_FORMAT environment variable is set to 'json'.
+#
 
 
 class Colors:
@@ -14,22 +37,143 @@ class Colors:
     UNDERLINE = "\033[4m"
 
 
+# Matches ANSI color codes
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+# The color of the 'inv' header of every log level; raw output has no header
+LEVEL_COLORS: Dict[str, str] = {
+    "ok": Colors.OKGREEN,
+    "info": Colors.OKCYAN,
+    "warn": Colors.WARNING,
+    "error": Colors.FAIL,
+}
+
+
+class Logger:
+    """A thread safe logger, writing to the given `sink` or, if None, to the current `sys.stdout`. When `colors` is
+    None, colors are used only if the sink is a terminal and NO_COLOR is not set."""
+
+    def __init__(
+        self,
+        sink: Optional[IO[str]] = None,
+        json_lines: bool = False,
+        colors: Optional[bool] = None,
+    ) -> None:
+        self.sink = sink
+        self.json_lines = json_lines
+        self.colors = colors
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_sink(self) -> IO[str]:
+        """Return the sink. Stdout is looked up every time, so that it can be redirected."""
+        return self.sink or sys.stdout
+
+    def use_colors(self) -> bool:
+        """Return whether the written lines should be colored."""
+        if self.colors is not None:
+            return self.colors
+        if "NO_COLOR" in os.environ:
+            return False
+        if "FORCE_COLOR" in os.environ:
+            return True
+        isatty = getattr(self.get_sink(), "isatty", None)
+        return bool(isatty and isatty())
+
+    def get_task(self) -> Optional[str]:
+        """Return the task set for the current thread, if any."""
+        return getattr(self._local, "task", None)
+
+    @contextmanager
+    def task_prefix(self, task: str) -> Generator[None, None, None]:
+        """Prefix the lines logged by the current thread in the code block with the given task name."""
+        previous = self.get_task()
+        self._local.task = task
+        try:
+            yield
+        finally:
+            self._local.task = previous
+
+    @contextmanager
+    def batch(self) -> Generator[None, None, None]:
+        """Collect the lines logged by the current thread in the code block and write them all at the end, at once."""
+        if getattr(self._local, "batch", None) is not None:
+            # already batching
+            yield
+            return
+        self._local.batch = []
+        try:
+            yield
+        finally:
+            lines, self._local.batch = self._local.batch, None
+            self._write(lines)
+
+    def log(self, level: str, msg: str) -> None:
+        """Log a message with the given level ('ok', 'info', 'warn', 'error' or 'output' for raw lines)."""
+        task = self.get_task()
+        if self.json_lines:
+            record = {"time": time.time(), "level": level, "task": task}
+            line = json.dumps({**record, "message": ANSI_ESCAPE.sub("", msg)})
+        else:
+            color = LEVEL_COLORS.get(level)
+            line = f"{color}{Colors.BOLD}inv{Colors.ENDC} > " if color else ""
+            line += f"[{task}] {msg}" if task else msg
+            if not self.use_colors():
+                line = ANSI_ESCAPE.sub("", line)
+        batch: Optional[List[str]] = getattr(self._local, "batch", None)
+        if batch is not None:
+            batch.append(line)
+        else:
+            self._write([line])
+
+    def _write(self, lines: List[str]) -> None:
+        """Write the given lines to the sink with a single write."""
+        if not lines:
+            return
+        with self._lock:
+            sink = self.get_sink()
+            sink.write("".join(f"{line}\n" for line in lines))
+            sink.flush()
+
+
+logger = Logger(json_lines=os.environ.get("INVOKE_POETRY_LOG_FORMAT") == "json")
+
+
+def configure_logging(
+    sink: Optional[IO[str]] = None,
+    json_lines: Optional[bool] = None,
+    colors: Optional[bool] = None,
+) -> None:
+    """Configure the module-wide logger. Arguments left to None are not changed, but for `colors`, which goes back
+    to automatic detection."""
+    if sink is not None:
+        logger.sink = sink
+    if json_lines is not None:
+        logger.json_lines = json_lines
+    logger.colors = colors
+
+
+def echo(msg: str) -> None:
+    """Log a raw line of output."""
+    logger.log("output", msg)
+
+
 def ok(msg: str, do_print: bool = True) -> None:
     if do_print:
-        print(f"{Colors.OKGREEN}{Colors.BOLD}inv{Colors.ENDC} > {msg}")
+        logger.log("ok", msg)
 
 
 def info(msg: str, do_print: bool = True) -> None:
     if do_print:
-        print(f"{Colors.OKCYAN}{Colors.BOLD}inv{Colors.ENDC} > {msg}")
+        logger.log("info", msg)
 
 
 def warn(msg: str, do_print: bool = True) -> None:
     if do_print:
-        print(f"{Colors.WARNING}{Colors.BOLD}inv{Colors.ENDC} > {msg}")
+        logger.log("warn", msg)
 
 
 def error(msg: str, exit_now: bool = True) -> None:
-    print(f"{Colors.FAIL}{Colors.BOLD}inv{Colors.ENDC} > {msg}")
+    logger.log("error", msg)
     if exit_now:
         exit(1)
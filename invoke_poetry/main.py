@@ -1,19 +1,37 @@
 from __future__ import annotations
 
+import os
 import sys
 from contextlib import contextmanager
-from typing import Any, Callable, Generator, Iterable, List, Optional, Tuple
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple
 
 from invoke import Collection, Context, Result  # type: ignore[attr-defined]
 from invoke.exceptions import UnexpectedExit
 
 from invoke_poetry.decorator import CollectionDecorator, OverloadedDecoratorType
-from invoke_poetry.env import active_env, env, validate_env_version
-from invoke_poetry.logs import error, warn
+from invoke_poetry.env import (
+    active_env,
+    env,
+    env_get_path,
+    get_venv_environ,
+    validate_env_version,
+)
+from invoke_poetry.logs import error, info, warn
 from invoke_poetry.matrix import TaskMatrix
 from invoke_poetry.poetry_api import PoetryAPI
 from invoke_poetry.settings import Settings
-from invoke_poetry.utils import IsInterrupted, capture_sigint
+from invoke_poetry.templates import PROJECT_FILES
+from invoke_poetry.utils import (
+    IsInterrupted,
+    capture_sigint,
+    get_callable_identity,
+    get_files_hash,
+    stable_repr,
+)
+
+# File saved in each venv to record its last project dependencies installation
+INSTALL_STAMP_FILE = "invoke-poetry-install.stamp"
 
 
 def init_ns(
@@ -22,6 +40,9 @@ def init_ns(
     install_project_dependencies_hook: Optional[Callable[..., Any]] = None,
     poetry_bin: Optional[str] = None,
     venv_link_path: Optional[str] = None,
+    use_poetry_run: bool = True,
+    env_templates_path: Optional[str] = None,
+    state_path: Optional[str] = None,
 ) -> Tuple[Collection, OverloadedDecoratorType]:
     """Prepare the root invoke collection and set all required settings.
     Invoke REQUIRES a root collection specifically named 'ns' in the tasks.py file, so use this function like this:
@@ -50,6 +71,9 @@ def init_ns(
         install_project_dependencies_hook=install_project_dependencies_hook,
         poetry_bin=poetry_bin,
         venv_link_path=venv_link_path,
+        use_poetry_run=use_poetry_run,
+        env_templates_path=env_templates_path,
+        state_path=state_path,
     )
 
     # Set up the poetry api
@@ -78,6 +102,8 @@ def poetry_runner(
     rollback_env: bool = True,
     link: bool = False,
     quiet: bool = False,
+    direct: bool = False,
+    poetry_run: Optional[bool] = None,
 ) -> Generator[Callable[..., Optional[Result]], None, None]:
     """
     Context manager offering a patched `Context.run` function that will launch the given command in the specified poetry
@@ -86,6 +112,15 @@ def poetry_runner(
     The previous virtualenv (if one was active) will be restored after the context manager exits, by default.
     It will also react correctly to user interruptions via ctrl-c.
 
+    When `direct` is True the active env is never switched: the env path is resolved (creating the env if needed) and
+    commands are launched with its `bin/` folder prepended to PATH and VIRTUAL_ENV set. Since no global state is
+    touched, `rollback_env` and `link` are ignored and several direct runners can be safely used at the same time,
+    e.g. in a parallel `task_matrix`.
+
+    When `poetry_run` is False (the default comes from the `use_poetry_run` setting of `init_ns`) commands are not
+    prefixed with `poetry run`: they are launched directly with the activated env environment variables instead,
+    sparing a poetry startup for every command.
+
     ```python
     @task
     def get_version(c: Context, python_version: str = "3.7"):
@@ -99,6 +134,10 @@ def poetry_runner(
         # validate the given python version
         python_env = validate_env_version(python_env)
 
+        if direct:
+            yield venv_runner(c, env_get_path(python_env, quiet=quiet))
+            return
+
         # restore the previous env if needed after the context code block
         with active_env(
             python_version=python_env,
@@ -106,8 +145,14 @@ def poetry_runner(
             rollback_env=rollback_env,
             link=link,
         ):
+            if poetry_run is None:
+                poetry_run = Settings.use_poetry_run
+            if not poetry_run:
+                yield venv_runner(c, PoetryAPI.get_active_env_path())
+                return
+
             # prepare the patched runner and yield it
-            def poetry_run(*args: Any, **kwargs: Any) -> Optional[Result]:
+            def poetry_run_runner(*args: Any, **kwargs: Any) -> Optional[Result]:
                 """A patched runner that prepends 'poetry run' to the given command."""
                 poetry_run_cmd = Settings.poetry_bin + " run"
                 if "command" in kwargs:
@@ -118,7 +163,21 @@ def poetry_runner(
                     command = f"{poetry_run_cmd} {args[0]}"
                 return c.run(command=command, **kwargs)
 
-            yield poetry_run
+            yield poetry_run_runner
+
+
+def venv_runner(c: Context, venv_path: Path) -> Callable[..., Optional[Result]]:
+    """Return a patched `Context.run` function that will launch the given command inside the specified venv, without
+    activating it. Commands get the same environment `poetry run` would give them."""
+    environ = get_venv_environ(venv_path)
+
+    def venv_run(*args: Any, **kwargs: Any) -> Optional[Result]:
+        """A patched runner that launches the given command with the venv environment."""
+        kwargs["env"] = {**environ, **kwargs.get("env", {})}
+        kwargs["replace_env"] = True
+        return c.run(*args, **kwargs)
+
+    return venv_run
 
 
 @contextmanager
@@ -141,10 +200,61 @@ def user_can_interrupt() -> Generator[None, None, None]:
             raise e
 
 
-def install_project_dependencies(c: Context, *args: Any, **kwargs: Any) -> Any:
+def install_project_dependencies(
+    c: Context,
+    *args: Any,
+    venv_path: Optional[Path] = None,
+    skip_unchanged: bool = False,
+    **kwargs: Any,
+) -> Any:
     """A convenience function to call the install_project_dependencies hook (either the custom or the default one).
-    It will pass forward every argument."""
-    return Settings.install_project_dependencies_hook(c, *args, **kwargs)
+    It will pass forward every other argument.
+
+    A stamp recording the project files, the project folder, the hook and its arguments is saved in the target venv
+    (by default, the active env) after every successful installation. With `skip_unchanged` the installation is
+    skipped if the stamp shows that nothing changed since the last one. Stamps are only used with virtualenvs, never
+    with the system env.
+    """
+    if venv_path is None:
+        venv_path = PoetryAPI.get_active_env_path()
+    stamp_file = venv_path / INSTALL_STAMP_FILE
+    stamp = _get_install_stamp(args, kwargs)
+    is_venv = (venv_path / "pyvenv.cfg").is_file()
+
+    if (
+        is_venv
+        and skip_unchanged
+        and stamp_file.is_file()
+        and stamp_file.read_text() == stamp
+    ):
+        if not kwargs.get("quiet"):
+            info("Project dependencies already up to date, installation skipped.")
+        return None
+
+    result = Settings.install_project_dependencies_hook(c, *args, **kwargs)
+
+    # a failed result is returned, instead of raised, when the hook is called with `warn=True`
+    failed = isinstance(result, Result) and not result.ok
+    if is_venv and not failed:
+        # replace the stamp instead of modifying it, since it could be hardlinked to an env template
+        tmp_stamp_file = stamp_file.with_name(f".{stamp_file.name}.{os.getpid()}")
+        tmp_stamp_file.write_text(stamp)
+        os.replace(tmp_stamp_file, stamp_file)
+    return result
+
+
+def _get_install_stamp(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    """Return a string identifying the current project state, the install hook and its arguments. The `quiet`
+    argument is left out, since it only affects the output."""
+    return "\n".join(
+        [
+            get_files_hash(PROJECT_FILES),
+            str(Path(".").absolute()),
+            get_callable_identity(Settings.install_project_dependencies_hook),
+            stable_repr(args),
+            stable_repr({k: v for k, v in kwargs.items() if k != "quiet"}),
+        ]
+    )
 
 
 def get_additional_args() -> List[str]:
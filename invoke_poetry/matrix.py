@@ -1,13 +1,50 @@
 from __future__ import annotations
 
 import enum
-from contextlib import contextmanager
-from dataclasses import dataclass, field
-from typing import Any, Callable, ClassVar, Dict, Generator, Iterable, List, Tuple
-
-from invoke_poetry import remember_active_env
-from invoke_poetry.logs import Colors, error, info, warn
-from invoke_poetry.utils import IsInterrupted, capture_sigint
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Collection,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
+
+from invoke_poetry.cache import ResultCache
+from invoke_poetry.capture import OutputCapture, capture_output, get_log_path
+from invoke_poetry.env import remember_active_env
+from invoke_poetry.history import DurationHistory
+from invoke_poetry.logs import Colors, echo, error, info, logger, warn
+from invoke_poetry.reports import JsonLinesReporter, JUnitReporter, MatrixReporter
+from invoke_poetry.utils import (
+    IsInterrupted,
+    capture_sigint,
+    describe_exception,
+    flag_user_interrupt_only,
+    get_return_code,
+    in_main_thread,
+    kill_process_tree,
+    on_subprocess_exit,
+    on_subprocess_spawn,
+)
+
+# How often, in seconds, parallel task matrices check for user interrupts
+INTERRUPT_POLL_INTERVAL = 0.1
 
 
 class TaskState(enum.Enum):
@@ -18,6 +55,24 @@ class TaskState(enum.Enum):
     FAILED = 1
     SKIPPED = 2
     INTERRUPTED = 3
+    CANCELLED = 4
+    CACHED = 5
+    FLAKY = 6
+
+    @property
+    def is_failure(self) -> bool:
+        """Whether the state means that the task did not succeed, or did not run at all."""
+        return self in (
+            TaskState.FAILED,
+            TaskState.SKIPPED,
+            TaskState.INTERRUPTED,
+            TaskState.CANCELLED,
+        )
+
+    @property
+    def is_success(self) -> bool:
+        """Whether the state means that the task concluded successfully, so that its dependents can run."""
+        return self in (TaskState.OK, TaskState.CACHED, TaskState.FLAKY)
 
     def get_colored_name(self) -> str:
         """Return a colored state name."""
@@ -31,19 +86,154 @@ class TaskState(enum.Enum):
             Colors.FAIL,  # failed
             Colors.BLUE,  # skipped
             Colors.WARNING,  # interrupted
+            Colors.WARNING,  # cancelled
+            Colors.OKGREEN,  # cached
+            Colors.WARNING,  # flaky
         ][self.value + 1]
 
 
+@dataclass
+class TaskStats:
+    """Resources used by a matrix task, including the child processes it spawned. Skipped tasks have no stats."""
+
+    # Start and end timestamps, in seconds since the epoch
+    started_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    # Elapsed time, in seconds
+    wall_time: Optional[float] = None
+    # CPU time (user + system) of the task thread and of its child processes, in seconds
+    cpu_time: Optional[float] = None
+    # The highest resident set size reached by one of its child processes, in bytes
+    children_peak_rss: Optional[int] = None
+    # The number of child processes spawned, usually one per command
+    spawned: int = 0
+
+    def get_summary(self) -> str:
+        """Return a short human readable summary of the stats."""
+        if self.wall_time is None:
+            return ""
+        summary = f"{self.wall_time:.2f}s"
+        if self.cpu_time is not None:
+            summary += f", cpu {self.cpu_time:.2f}s"
+        if self.children_peak_rss:
+            summary += f", peak rss {self.children_peak_rss / 2**20:.1f}MiB"
+        return summary + f", {self.spawned} commands"
+
+    @contextmanager
+    def record(self) -> Generator[None, None, None]:
+        """Record the resources used while the code block runs. Only processes spawned by the current thread are
+        accounted for, so that concurrent tasks do not mix up their stats."""
+        thread = threading.current_thread()
+        pids: Set[int] = set()
+        children_cpu_time = 0.0
+        children_peak_rss = 0
+
+        def on_spawn(pid: int) -> None:
+            if threading.current_thread() is thread:
+                pids.add(pid)
+                self.spawned += 1
+
+        def on_exit(pid: int, rusage: Any) -> None:
+            nonlocal children_cpu_time, children_peak_rss
+            if pid in pids:
+                children_cpu_time += rusage.ru_utime + rusage.ru_stime
+                # ru_maxrss is expressed in kilobytes everywhere but on macOS
+                rss = rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+                children_peak_rss = max(children_peak_rss, rss)
+
+        self.started_at = time.time()
+        start = time.perf_counter()
+        start_cpu_time = time.thread_time()
+        exits_tracked = False
+        try:
+            with on_subprocess_spawn(on_spawn), on_subprocess_exit(on_exit) as tracked:
+                exits_tracked = tracked
+                yield
+        finally:
+            self.ended_at = time.time()
+            self.wall_time = time.perf_counter() - start
+            # without the usage of child processes only the wall time is meaningful
+            if exits_tracked:
+                self.cpu_time = time.thread_time() - start_cpu_time + children_cpu_time
+                self.children_peak_rss = children_peak_rss or None
+
+
+@dataclass
+class RetryPolicy:
+    """Describe how to retry a failed matrix task.
+
+    A task is retried up to `count` times, waiting `backoff` seconds before the first retry and multiplying the wait
+    by `backoff_factor` for every following one. Only failures raising one of the `exceptions` are retried; if
+    `return_codes` is given, failed commands (like invoke UnexpectedExit) are retried only if they exited with one of
+    those return codes.
+    """
+
+    count: int = 0
+    backoff: float = 0.0
+    backoff_factor: float = 2.0
+    exceptions: Tuple[Type[BaseException], ...] = (Exception,)
+    return_codes: Optional[Collection[int]] = None
+
+    def is_retryable(self, exception: BaseException) -> bool:
+        """Return True if the given failure may be retried."""
+        if not isinstance(exception, self.exceptions):
+            return False
+        return_code = get_return_code(exception)
+        return (
+            self.return_codes is None
+            or return_code is None
+            or return_code in self.return_codes
+        )
+
+    def get_backoff(self, retry: int) -> float:
+        """Return the seconds to wait before the given retry (starting from 1)."""
+        return self.backoff * self.backoff_factor ** (retry - 1)
+
+
+@dataclass
+class TaskAttempt:
+    """A single launch of a matrix task hook."""
+
+    # The command return code, if known
+    return_code: Optional[int] = None
+    # The raised exception description, if the attempt failed
+    error: Optional[str] = None
+    # Elapsed time, in seconds
+    wall_time: float = 0.0
+
+
 @dataclass
 class MatrixTask:
     """A matrix task, with a `name` and its current `state`.
 
-    When concluded, if the task returned something, it may be found in the `returned` field.
+    When concluded, if the task returned something, it may be found in the `returned` field, while the resources it
+    used are in the `stats` field. If the task returned or failed with a command result, its return code is saved in
+    `return_code`; if it failed, the exception is described in `error`. Every launch of the task hook, retries
+    included, is recorded in `attempts`. If its output was captured, it's in the `log_path` file, while its last lines
+    are in `output_tail`.
     """
 
     name: str
     state: TaskState = TaskState.RUNNING
     returned: Any = None
+    stats: TaskStats = field(default_factory=TaskStats)
+    return_code: Optional[int] = None
+    error: Optional[str] = None
+    attempts: List[TaskAttempt] = field(default_factory=lambda: [])
+    log_path: Optional[Path] = None
+    output_tail: List[str] = field(default_factory=lambda: [])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON serializable representation of the task."""
+        return {
+            "name": self.name,
+            "state": self.state.name,
+            "return_code": self.return_code,
+            "error": self.error,
+            "attempts": [asdict(attempt) for attempt in self.attempts],
+            "log_path": str(self.log_path) if self.log_path else None,
+            **asdict(self.stats),
+        }
 
     def report_state(self) -> None:
         """Print a report that illustrates the task state."""
@@ -58,6 +248,9 @@ class MatrixTask:
             (error, {"exit_now": False}),  # failed
             (warn, {"do_print": True}),  # skipped
             (warn, {"do_print": True}),  # interrupted
+            (warn, {"do_print": True}),  # cancelled
+            (info, {"do_print": True}),  # cached
+            (warn, {"do_print": True}),  # flaky
         ][self.state.value + 1]
 
 
@@ -69,33 +262,86 @@ class TaskMatrix:
     tasks: List[MatrixTask] = field(default_factory=lambda: [])
     # Whether to print all tasks steps
     quiet: bool = False
+    # Reporters fed with every registered task
+    reporters: List[MatrixReporter] = field(default_factory=lambda: [])
+    # The number of failed tasks after which the remaining ones are skipped; None means no limit
+    max_failures: Optional[int] = None
+    # Whether to also cancel running tasks, killing their commands, once `max_failures` is reached
+    cancel_running: bool = False
+    # Whether `max_failures` has been reached
+    stopped: bool = False
+    # Where the durations of successful tasks are recorded, if set
+    history: Optional[DurationHistory] = None
+    # Whether to capture the output of every task in its log file, instead of printing it
+    capture_output: bool = False
+
+    # Commands running on behalf of every task, killed when cancelling or interrupting running tasks
+    _running_pids: Dict[str, Set[int]] = field(default_factory=lambda: {}, repr=False)
+    _cancelled: Set[str] = field(default_factory=lambda: set(), repr=False)
+    _interrupted: Set[str] = field(default_factory=lambda: set(), repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
     # A class variable that indicates if a task matrix job is underway
     running: ClassVar[bool] = False
 
     def print_report(self) -> None:
         """Print a report of the current tasks states."""
-        info("Test matrix results:\n")
-        for task in self.tasks:
-            print(f"\t{task.name}:\t{task.state.get_colored_name()}")
+        with logger.batch():
+            info("Test matrix results:\n")
+            for task in self.tasks:
+                stats = task.stats.get_summary()
+                echo(
+                    f"\t{task.name}:\t{task.state.get_colored_name()}"
+                    + (f"\t({stats})" if stats else "")
+                )
+            for task in self.tasks:
+                if task.state.is_failure and task.log_path:
+                    echo(
+                        f"\n{task.name} last output lines (full log: {task.log_path}):"
+                    )
+                    for line in task.output_tail:
+                        echo(f"\t{line}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON serializable representation of the matrix."""
+        return {"tasks": [task.to_dict() for task in self.tasks]}
 
     def exit_with_rc(self) -> None:
         """Exit, possibly with an error if one of the task failed somehow."""
         for task in self.tasks:
-            if task.state.value > 0:
+            if task.state.is_failure:
                 exit(1)
         exit()
 
     @staticmethod
     @contextmanager
-    def new(quiet: bool = False) -> Generator[TaskMatrix, None, None]:
+    def new(
+        quiet: bool = False,
+        reporters: Optional[List[MatrixReporter]] = None,
+        max_failures: Optional[int] = None,
+        cancel_running: bool = False,
+        history: Optional[DurationHistory] = None,
+        capture_output: bool = False,
+    ) -> Generator[TaskMatrix, None, None]:
         """Context manager used to run a matrix job. It makes sure that the `running` class variable is correctly
-        set."""
+        set, that reporters are closed and that the durations history is saved."""
         TaskMatrix.running = True
+        tm = TaskMatrix(
+            quiet=quiet,
+            reporters=reporters or [],
+            max_failures=max_failures,
+            cancel_running=cancel_running,
+            history=history,
+            capture_output=capture_output,
+        )
         try:
-            yield TaskMatrix(quiet=quiet)
+            yield tm
         finally:
             TaskMatrix.running = False
+            for reporter in tm.reporters:
+                reporter.close()
+            if tm.history:
+                tm.history.save()
 
     def register_new_task(
         self, name: str, state: TaskState, returned: Any = None
@@ -108,6 +354,88 @@ class TaskMatrix:
         if not self.quiet:
             task.report_state()
         self.tasks.append(task)
+        for reporter in self.reporters:
+            reporter.add_task(task)
+        if (
+            self.history
+            and task.state in (TaskState.OK, TaskState.FLAKY)
+            and task.stats.wall_time is not None
+        ):
+            self.history.record(task.name, task.stats.wall_time)
+        if (
+            not self.stopped
+            and self.max_failures is not None
+            and len([t for t in self.tasks if t.state == TaskState.FAILED])
+            >= self.max_failures
+        ):
+            self.stop()
+
+    def stop(self) -> None:
+        """Skip all tasks not yet launched and, if `cancel_running` is set, cancel the running ones."""
+        to_kill: List[int] = []
+        with self._lock:
+            self.stopped = True
+            if self.cancel_running:
+                for name, pids in self._running_pids.items():
+                    self._cancelled.add(name)
+                    to_kill.extend(pids)
+        # killing may spawn processes, whose listeners need the lock
+        for pid in to_kill:
+            kill_process_tree(pid)
+
+    def interrupt(self) -> None:
+        """Interrupt the running tasks after a user interrupt, killing their commands. Needed when tasks run in
+        worker threads, since the user interrupt does not reach commands running in their own session (like the ones
+        in a pty)."""
+        to_kill: List[int] = []
+        with self._lock:
+            for name, pids in self._running_pids.items():
+                self._interrupted.add(name)
+                to_kill.extend(pids)
+        for pid in to_kill:
+            kill_process_tree(pid)
+
+    def is_cancelled(self, task: MatrixTask) -> bool:
+        """Return whether the given task has been cancelled while running."""
+        with self._lock:
+            return task.name in self._cancelled
+
+    def is_interrupted(self, task: MatrixTask) -> bool:
+        """Return whether the given task has been interrupted by the user while running."""
+        with self._lock:
+            return task.name in self._interrupted
+
+    @contextmanager
+    def track_commands(self, task: MatrixTask) -> Generator[None, None, None]:
+        """Keep track of the commands spawned by the current thread on behalf of the given task, so that they can be
+        killed if running tasks are cancelled or interrupted."""
+        thread = threading.current_thread()
+        pids: Set[int] = set()
+
+        def on_spawn(pid: int) -> None:
+            if threading.current_thread() is not thread:
+                return
+            with self._lock:
+                pids.add(pid)
+                stopped = task.name in self._cancelled or task.name in self._interrupted
+            if stopped:
+                # the task has been cancelled or interrupted while launching this command
+                kill_process_tree(pid)
+
+        def on_exit(pid: int, _: Any) -> None:
+            with self._lock:
+                pids.discard(pid)
+
+        with self._lock:
+            self._running_pids[task.name] = pids
+            if self.stopped and self.cancel_running:
+                self._cancelled.add(task.name)
+        try:
+            with on_subprocess_spawn(on_spawn), on_subprocess_exit(on_exit):
+                yield
+        finally:
+            with self._lock:
+                del self._running_pids[task.name]
 
 
 def task_matrix(
@@ -115,6 +443,20 @@ def task_matrix(
     hook_args_builder: Callable[[str], Tuple[List[Any], Dict[str, Any]]],
     task_names: Iterable[str],
     print_steps: bool = True,
+    parallel: bool = False,
+    max_workers: Optional[int] = None,
+    json_report: Optional[Path] = None,
+    junit_report: Optional[Path] = None,
+    fail_fast: bool = False,
+    max_failures: Optional[int] = None,
+    cancel_running: bool = False,
+    cache: bool = False,
+    cache_inputs: Optional[Iterable[str]] = None,
+    retry: Optional[RetryPolicy] = None,
+    retry_overrides: Optional[Dict[str, RetryPolicy]] = None,
+    dependencies: Optional[Dict[str, Iterable[str]]] = None,
+    history: bool = False,
+    capture: bool = False,
 ) -> TaskMatrix:
     """Launch the task `hook` function once for every task name provided. The hook args are built using the
     `hook_args_builder` hook, which receives the current task name.
@@ -142,37 +484,358 @@ def task_matrix(
         )
     ```
 
+    When `parallel` is True the tasks are launched concurrently in a thread pool of at most `max_workers` threads (by
+    default, one per task up to the number of available cpus). Hooks must then be safe to run concurrently: they
+    should not switch the active poetry env, so use `poetry_runner` in direct mode. On a user interrupt, tasks still
+    waiting for a worker are marked as skipped, while the running ones are left to react to the interruption.
+
+    By default all tasks are launched, even after a failure. With `fail_fast` the remaining tasks are skipped after
+    the first failed one, or after `max_failures` failed ones if given. Running parallel tasks are left to conclude,
+    unless `cancel_running` is set: their commands are then killed and they are marked as cancelled.
+
+    With `cache` set, OK results are cached on disk: a task is not launched again, and it's marked as cached instead,
+    if its name, its hook and hook args, the interpreter it runs with and the content of the input files did not
+    change since its last OK run. Input files are the ones matching the `cache_inputs` glob patterns or, by default,
+    all files tracked by git. See the `cache` module for details.
+
+    Failed tasks can be retried following the `retry` policy or, for specific task names, the policies in
+    `retry_overrides`. Tasks that succeed only after a retry are marked as flaky.
+
+    Tasks can depend on other tasks: `dependencies` maps a task name to the names of the tasks that must succeed
+    before it's launched, e.g. `{"test-3.8": ["build"], "coverage": ["test-3.8", "test-3.9"]}`. Tasks are launched in
+    a topological order and, when parallel, as soon as their dependencies succeed, so that independent branches run
+    concurrently. Tasks whose dependencies did not succeed (failed, or were skipped themselves) are marked as skipped.
+    A ValueError is raised if task names are duplicated, or if the dependencies are unknown task names or form a
+    cycle.
+
+    With `history` set, the durations of successful tasks are recorded on disk and parallel tasks are launched
+    longest first, as expected from past runs, so that slow tasks do not stretch the run by starting last. See the
+    `history` module for details.
+
+    With `capture` set, the output of every task, including the one of the commands it launches through invoke, is
+    written to its own log file instead of the terminal; the report then shows the last output lines of failed tasks.
+    See the `capture` module for details.
+
+    Machine-readable reports can be written, as tasks conclude, to the `json_report` (one JSON object per line) and
+    `junit_report` (JUnit XML) paths.
+
     It returns a TaskMatrix object, which allows further operations, like printing a report or exiting with a specific
-    exit code.
+    exit code. Tasks are always listed in the order their names were given.
     """
 
+    names = list(task_names)
+    graph = _get_dependency_graph(names, dependencies or {})
+    positions = {name: i for i, name in enumerate(names)}
+
     capture_sigint()
 
-    with remember_active_env(quiet=False), TaskMatrix.new(quiet=not print_steps) as tm:
-        for name in task_names:
-            try:
-                if IsInterrupted.by_user:
-                    # this task should not be launched, register it as skipped
-                    tm.register_new_task(name=name, state=TaskState.SKIPPED)
-                else:
-                    # prepare a new task
-                    task = MatrixTask(name=name)
-                    if print_steps:
-                        task.report_state()
-                    # build the task args and kwargs
-                    hook_args, hook_kwargs = hook_args_builder(name)
-                    # launch the task and save its return value
-                    task.returned = hook(*hook_args, **hook_kwargs)
-                    # mark the task as completed and register it
-                    task.state = TaskState.OK
-                    tm.register_task(task)
-            except (BaseException,):
-                if not IsInterrupted.by_user:
-                    # Something bad happened, register the task as failed
-                    tm.register_new_task(name=name, state=TaskState.FAILED)
+    reporters: List[MatrixReporter] = []
+    if json_report:
+        reporters.append(JsonLinesReporter(json_report))
+    if junit_report:
+        reporters.append(JUnitReporter(junit_report))
+
+    result_cache = ResultCache(cache_inputs) if cache else None
+
+    def get_retry_policy(name: str) -> Optional[RetryPolicy]:
+        return (retry_overrides or {}).get(name, retry)
+
+    if fail_fast and max_failures is None:
+        max_failures = 1
+
+    with remember_active_env(quiet=False), TaskMatrix.new(
+        quiet=not print_steps,
+        reporters=reporters,
+        max_failures=max_failures,
+        cancel_running=cancel_running,
+        history=DurationHistory() if history else None,
+        capture_output=capture,
+    ) as tm:
+        if parallel:
+            _run_parallel_tasks(
+                tm,
+                hook,
+                hook_args_builder,
+                graph,
+                print_steps,
+                max_workers,
+                result_cache,
+                get_retry_policy,
+            )
+        else:
+            states: Dict[str, TaskState] = {}
+            for name, task_dependencies in graph.items():
+                task = MatrixTask(name=name)
+                if all(states[dep].is_success for dep in task_dependencies):
+                    _run_task(
+                        tm,
+                        task,
+                        hook,
+                        hook_args_builder,
+                        print_steps,
+                        result_cache,
+                        get_retry_policy(name),
+                    )
                 else:
-                    # the user interrupted the task, mark it as interrupted; remaining tasks will be skipped
-                    tm.register_new_task(name=name, state=TaskState.INTERRUPTED)
-                    IsInterrupted.by_user = True
+                    task.state = TaskState.SKIPPED
+                tm.register_task(task)
+                states[name] = task.state
+
+        # keep the tasks in the order they were given
+        tm.tasks.sort(key=lambda t: positions[t.name])
 
         return tm
+
+
+def _get_dependency_graph(
+    task_names: List[str], dependencies: Dict[str, Iterable[str]]
+) -> Dict[str, List[str]]:
+    """Return the dependencies of every task, with tasks in a topological order that stays as close as possible to
+    the given one. Raise a ValueError if task names are duplicated, or if dependencies name unknown tasks or form a
+    cycle.
+    """
+    graph = {name: list(dependencies.get(name, [])) for name in task_names}
+    if len(graph) < len(task_names):
+        duplicated = sorted(
+            name for name, count in Counter(task_names).items() if count > 1
+        )
+        raise ValueError(f"Duplicated task names: {', '.join(duplicated)}")
+    unknown = sorted(
+        {dep for deps in dependencies.values() for dep in deps}.union(dependencies)
+        - set(graph)
+    )
+    if unknown:
+        raise ValueError(f"Unknown task names in dependencies: {', '.join(unknown)}")
+    ordered: Dict[str, List[str]] = {}
+    while len(ordered) < len(graph):
+        # always pick the first task, in the given order, whose dependencies have been picked already
+        name = next(
+            (
+                name
+                for name, deps in graph.items()
+                if name not in ordered and all(dep in ordered for dep in deps)
+            ),
+            None,
+        )
+        if name is None:
+            cycle = [name for name in graph if name not in ordered]
+            raise ValueError(f"Dependency cycle between tasks: {', '.join(cycle)}")
+        ordered[name] = graph[name]
+    return ordered
+
+
+def _run_task(
+    tm: TaskMatrix,
+    task: MatrixTask,
+    hook: Callable[..., Any],
+    hook_args_builder: Callable[[str], Tuple[List[Any], Dict[str, Any]]],
+    print_steps: bool,
+    result_cache: Optional[ResultCache] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> MatrixTask:
+    """Launch the hook for the given task, updating its state and return value. It never raises."""
+    try:
+        if IsInterrupted.by_user or tm.stopped:
+            # this task should not be launched, mark it as skipped
+            task.state = TaskState.SKIPPED
+            return task
+        # build the task args and kwargs
+        hook_args, hook_kwargs = hook_args_builder(task.name)
+        fingerprint = None
+        if result_cache:
+            fingerprint = result_cache.get_fingerprint(
+                task.name, hook, hook_args, hook_kwargs
+            )
+            if result_cache.is_cached(task.name, fingerprint):
+                # nothing changed since the last OK run
+                task.state = TaskState.CACHED
+                return task
+            # do not trust stale results if this run gets interrupted
+            result_cache.discard(task.name)
+        if print_steps:
+            task.report_state()
+        # tell apart the messages logged by tasks running in parallel
+        prefix = nullcontext() if in_main_thread() else logger.task_prefix(task.name)
+        output = _capture_task_output(tm, task)
+        with task.stats.record(), tm.track_commands(task), prefix, output:
+            # launch the task, retrying it if needed, and save its return value
+            task.returned = _call_with_retries(
+                tm, task, hook, hook_args, hook_kwargs, retry_policy or RetryPolicy()
+            )
+        # mark the task as completed, unless its commands have been killed on a user interrupt
+        task.state = _get_completed_state(tm, task)
+        task.return_code = getattr(task.returned, "return_code", 0)
+        if result_cache and fingerprint:
+            result_cache.store(task.name, fingerprint)
+    except (BaseException,) as e:
+        task.return_code = get_return_code(e)
+        task.error = describe_exception(e)
+        if tm.is_cancelled(task):
+            # the task commands have been killed because too many tasks failed
+            task.state = TaskState.CANCELLED
+        elif not IsInterrupted.by_user:
+            # Something bad happened, mark the task as failed
+            task.state = TaskState.FAILED
+        else:
+            # the user interrupted the task, mark it as interrupted; remaining tasks will be skipped
+            task.state = TaskState.INTERRUPTED
+            IsInterrupted.by_user = True
+    return task
+
+
+def _get_completed_state(tm: TaskMatrix, task: MatrixTask) -> TaskState:
+    """Return the state of a task whose hook returned."""
+    if tm.is_interrupted(task):
+        return TaskState.INTERRUPTED
+    return TaskState.FLAKY if len(task.attempts) > 1 else TaskState.OK
+
+
+@contextmanager
+def _capture_task_output(
+    tm: TaskMatrix, task: MatrixTask
+) -> Generator[None, None, None]:
+    """Capture the output of the task in the code block, if the matrix captures output."""
+    if not tm.capture_output:
+        yield
+        return
+    capture = OutputCapture(get_log_path(task.name))
+    try:
+        with capture_output(capture):
+            yield
+    finally:
+        task.log_path = capture.close()
+        task.output_tail = capture.get_tail()
+
+
+def _call_with_retries(
+    tm: TaskMatrix,
+    task: MatrixTask,
+    hook: Callable[..., Any],
+    hook_args: List[Any],
+    hook_kwargs: Dict[str, Any],
+    retry_policy: RetryPolicy,
+) -> Any:
+    """Launch the task hook and return its return value, retrying it on failure as the policy allows. Every attempt
+    is recorded in the task."""
+    while True:
+        attempt = TaskAttempt()
+        task.attempts.append(attempt)
+        start = time.perf_counter()
+        try:
+            returned = hook(*hook_args, **hook_kwargs)
+            attempt.return_code = getattr(returned, "return_code", 0)
+            return returned
+        except (BaseException,) as e:
+            attempt.return_code = get_return_code(e)
+            attempt.error = describe_exception(e)
+            retry = len(task.attempts)
+            if (
+                retry > retry_policy.count
+                or not retry_policy.is_retryable(e)
+                or not _wait_backoff(tm, task, retry_policy.get_backoff(retry))
+            ):
+                raise
+            warn(
+                f"task {task.name}: attempt {retry} failed, retrying",
+                do_print=not tm.quiet,
+            )
+        finally:
+            attempt.wall_time = time.perf_counter() - start
+
+
+def _wait_backoff(tm: TaskMatrix, task: MatrixTask, seconds: float) -> bool:
+    """Wait for the given seconds before a retry. Return False if, meanwhile, the task should have stopped."""
+    deadline = time.monotonic() + seconds
+    while True:
+        if IsInterrupted.by_user or tm.stopped or tm.is_cancelled(task):
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(remaining, 0.1))
+
+
+def _run_parallel_tasks(
+    tm: TaskMatrix,
+    hook: Callable[..., Any],
+    hook_args_builder: Callable[[str], Tuple[List[Any], Dict[str, Any]]],
+    graph: Dict[str, List[str]],
+    print_steps: bool,
+    max_workers: Optional[int],
+    result_cache: Optional[ResultCache],
+    get_retry_policy: Callable[[str], Optional[RetryPolicy]],
+) -> None:
+    """Launch all tasks in a bounded thread pool, each one as soon as its dependencies in `graph` succeeded,
+    registering them in `tm` as soon as they are done."""
+    if not graph:
+        return
+    if not max_workers:
+        max_workers = min(len(graph), os.cpu_count() or 1)
+    waiting = dict(graph)
+    states: Dict[str, TaskState] = {}
+
+    # SIGINTs only reach the main thread: just flag them, so that tasks still waiting for a worker get skipped, then
+    # interrupt the running ones from the main loop (signal handlers can't safely take the matrix lock)
+    capture_sigint(flag_user_interrupt_only)
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="task_matrix"
+        ) as executor:
+            pending: Set[Future[MatrixTask]] = set()
+
+            def launch_ready_tasks() -> None:
+                for name in _get_ready_tasks(tm, waiting, states):
+                    pending.add(
+                        executor.submit(
+                            _run_task,
+                            tm,
+                            MatrixTask(name=name),
+                            hook,
+                            hook_args_builder,
+                            print_steps,
+                            result_cache,
+                            get_retry_policy(name),
+                        )
+                    )
+
+            launch_ready_tasks()
+            interrupted = False
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=INTERRUPT_POLL_INTERVAL,
+                    return_when=FIRST_COMPLETED,
+                )
+                if IsInterrupted.by_user and not interrupted:
+                    interrupted = True
+                    tm.interrupt()
+                for future in done:
+                    task = future.result()
+                    tm.register_task(task)
+                    states[task.name] = task.state
+                launch_ready_tasks()
+    finally:
+        capture_sigint()
+
+
+def _get_ready_tasks(
+    tm: TaskMatrix, waiting: Dict[str, List[str]], states: Dict[str, TaskState]
+) -> List[str]:
+    """Remove from `waiting` the tasks whose dependencies concluded. Return the names of the ones whose dependencies
+    succeeded, in launch order, while registering the others as skipped."""
+    ready = []
+    for name, task_dependencies in list(waiting.items()):
+        # tasks are in a topological order, so skipped tasks are seen before their dependents
+        if not all(dep in states for dep in task_dependencies):
+            continue
+        del waiting[name]
+        if all(states[dep].is_success for dep in task_dependencies):
+            ready.append(name)
+        else:
+            task = MatrixTask(name=name, state=TaskState.SKIPPED)
+            tm.register_task(task)
+            states[name] = task.state
+    if tm.history:
+        # workers pick tasks in submission order
+        ready = tm.history.sort_longest_first(ready)
+    return ready
@@ -0,0 +1,148 @@
+import itertools
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+#
+# ABOUT THIS MODULE
+#
+# Multi-dimensional task matrices. A MatrixBuilder expands the cartesian product of several named axes (e.g. python
+# versions and dependency groups) into matrix entries, each one a dict mapping every axis to one of its values, like
+# {"python": "3.8", "deps": "min"}. Entries are named by joining their values (e.g. '3.8-min'), so that they can be
+# fed to `task_matrix` as task names, while the builder hook args builder maps them back to entries.
+#
+# Entries can be split into shards, so that the matrix can be spread on several CI machines: every machine builds the
+# same matrix and runs its own shard only. Given the expected durations of the entries (see the `history` module),
+# shards are balanced by expected time rather than by entry count.
+#
+
+
+Entry = Dict[str, str]
+
+
+class MatrixBuilder:
+    """Build the entries of a task matrix from the cartesian product of the given `axes`, mapping axis names to their
+    values; axes order is kept, in both entry names and entry ordering.
+
+    Entries matching any of the `exclude` rules are dropped: an entry matches a rule if it has all the rule values,
+    so `{"python": "3.8"}` drops all 3.8 entries. Then the `include` entries are added, unless already present: they
+    can leave some axes out and add keys that are not axes.
+
+    Entries are computed once, on first use. A ValueError is raised then if several entries have the same name.
+    """
+
+    def __init__(
+        self,
+        axes: Dict[str, Iterable[str]],
+        include: Optional[Iterable[Entry]] = None,
+        exclude: Optional[Iterable[Entry]] = None,
+        separator: str = "-",
+    ) -> None:
+        self.axes = {axis: list(values) for axis, values in axes.items()}
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.separator = separator
+        self._entries: Optional[Dict[str, Entry]] = None
+
+    def get_entries(self) -> List[Entry]:
+        """Return all matrix entries."""
+        return list(self._get_entries_by_name().values())
+
+    def get_name(self, entry: Entry) -> str:
+        """Return the name of the given entry, joining its axes values first and then any other value."""
+        values = [entry[axis] for axis in self.axes if axis in entry]
+        values += [value for key, value in entry.items() if key not in self.axes]
+        return self.separator.join(values)
+
+    def get_names(
+        self,
+        shard: Optional[Tuple[int, int]] = None,
+        durations: Optional[Dict[str, float]] = None,
+    ) -> List[str]:
+        """Return the names of all entries or, if given, of the entries in the shard. Shards are balanced using the
+        expected `durations` of the entries by name, if given."""
+        names = list(self._get_entries_by_name())
+        if shard and durations is not None:
+            return get_balanced_shard(names, *shard, durations)
+        if shard:
+            return get_shard(names, *shard)
+        return names
+
+    def get_entry(self, name: str) -> Entry:
+        """Return the entry with the given name. Raise a KeyError if there's none."""
+        return self._get_entries_by_name()[name]
+
+    def get_hook_args_builder(
+        self, builder: Callable[[Entry], Tuple[List[Any], Dict[str, Any]]]
+    ) -> Callable[[str], Tuple[List[Any], Dict[str, Any]]]:
+        """Adapt a hook args builder receiving matrix entries to the `task_matrix` one, receiving entry names."""
+        return lambda name: builder(self.get_entry(name))
+
+    def _get_entries_by_name(self) -> Dict[str, Entry]:
+        """Return all matrix entries by name, computing them on first use."""
+        if self._entries is not None:
+            return self._entries
+        entries = [
+            dict(zip(self.axes, values))
+            for values in itertools.product(*self.axes.values())
+        ]
+        entries = [
+            entry
+            for entry in entries
+            if not any(_matches(entry, rule) for rule in self.exclude)
+        ]
+        for rule in self.include:
+            if rule not in entries:
+                entries.append(dict(rule))
+        names = [self.get_name(entry) for entry in entries]
+        duplicated = sorted(name for name, count in Counter(names).items() if count > 1)
+        if duplicated:
+            raise ValueError(f"Several matrix entries named: {', '.join(duplicated)}")
+        self._entries = dict(zip(names, entries))
+        return self._entries
+
+
+def get_shard(entries: List[Any], index: int, count: int) -> List[Any]:
+    """Return the entries of shard `index` (starting from 1) of `count`. Entries are dealt round-robin, so that
+    shards differ by one entry at most and every machine computes the same split."""
+    _check_shard(index, count)
+    return entries[index - 1 :: count]
+
+
+def get_balanced_shard(
+    names: List[str], index: int, count: int, durations: Dict[str, float]
+) -> List[str]:
+    """Return the names in shard `index` (starting from 1) of `count`, balancing shards by the expected `durations`
+    (names without one count as instantaneous). Entries are dealt longest first to the shard expected to end
+    first, then to the one with fewer entries, so that without durations this falls back to a round-robin split.
+    Names keep their order."""
+    _check_shard(index, count)
+    loads = [(0.0, 0)] * count
+    shard = set()
+    for name in sorted(names, key=lambda name: -durations.get(name, 0.0)):
+        target = loads.index(min(loads))
+        load, size = loads[target]
+        loads[target] = (load + durations.get(name, 0.0), size + 1)
+        if target == index - 1:
+            shard.add(name)
+    return [name for name in names if name in shard]
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parse a shard in the 'K/N' format (e.g. '2/4', the second of four shards)."""
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{shard}', expected K/N (e.g. 2/4)") from None
+    _check_shard(index, count)
+    return index, count
+
+
+def _check_shard(index: int, count: int) -> None:
+    """Raise a ValueError if there's no shard `index` of `count`."""
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {index} of {count}")
+
+
+def _matches(entry: Entry, rule: Entry) -> bool:
+    """Return whether the entry has all the rule values."""
+    return all(entry.get(key) == value for key, value in rule.items())
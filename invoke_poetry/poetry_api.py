@@ -1,50 +1,143 @@
+from __future__ import annotations
+
+import os
+import shutil
 from pathlib import Path
-from typing import ClassVar, List, Optional
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+if TYPE_CHECKING:
+    # Importing poetry is slow: it's only done when the poetry objects are actually needed, see `_LazyPoetryAPI`
+    from poetry.poetry import Poetry
+    from poetry.utils.env import Env, EnvManager
+
+T = TypeVar("T")
+
+# Fingerprint of the poetry state envs discovery depends on
+CacheKey = Tuple[Optional[int], Optional[int], Optional[int], Optional[str]]
+
+
+class _LazyPoetryAPI(type):
+    """Metaclass that builds the `Poetry` and `EnvManager` objects used by `PoetryAPI` on first access, so that
+    importing invoke_poetry, listing tasks or running tasks that never touch an env stays fast.
+    """
+
+    project_path: Optional[Path] = None
+    _poetry: Optional[Poetry] = None
+    _env_manager: Optional[EnvManager] = None
 
-from poetry.factory import Factory
-from poetry.poetry import Poetry
-from poetry.utils.env import Env, EnvManager
+    @property
+    def poetry(cls) -> Poetry:
+        if cls._poetry is None:
+            from poetry.factory import Factory
 
+            cls._poetry = Factory().create_poetry(
+                cls.project_path or Path(".").absolute()
+            )
+        return cls._poetry
 
-class PoetryAPI:
+    @property
+    def env_manager(cls) -> EnvManager:
+        if cls._env_manager is None:
+            from poetry.utils.env import EnvManager
+
+            cls._env_manager = EnvManager(cls.poetry)
+        return cls._env_manager
+
+
+class PoetryAPI(metaclass=_LazyPoetryAPI):
     """TODO"""
 
-    poetry: ClassVar[Poetry]
-    env_manager: ClassVar[EnvManager]
+    # Envs discovery results, each stored with the cache key it was computed with
+    _cache: ClassVar[Dict[str, Tuple[CacheKey, Any]]] = {}
 
     @classmethod
     def init(cls) -> None:
-        cls.poetry = Factory().create_poetry(Path(".").absolute())
-        cls.env_manager = EnvManager(cls.poetry)
+        """Bind the api to the project in the current folder. Poetry objects will be lazily built on first use."""
+        cls.project_path = Path(".").absolute()
+        cls._poetry = None
+        cls._env_manager = None
+        cls.invalidate_cache()
 
     @classmethod
     def get_active_project_env_version(cls) -> Optional[str]:
         """Return the version of the active poetry env, if it's a poetry env associated with the current project,
         otherwise return None."""
-        env = cls._get_active_env()
-        if env.path.absolute() not in cls.get_available_env_paths():
-            return None
-        return cls._get_version_from_venv(env)
+        active_env_path = cls.get_active_env_path().absolute()
+        for path, version in cls._get_envs():
+            if path == active_env_path:
+                return version
+        return None
 
     @classmethod
     def get_active_env_path(cls) -> Path:
-        return cls._get_active_env().path
+        return cls._cached("active_env_path", lambda: cls._get_active_env().path)
 
     @classmethod
     def get_available_env_names(cls) -> List[str]:
-        return [cls._get_version_from_venv(env) for env in cls.env_manager.list()]
+        return [version for _, version in cls._get_envs()]
 
     @classmethod
     def is_env_available(cls, version: str) -> bool:
         return version in cls.get_available_env_names()
 
+    @classmethod
+    def get_env_path(cls, version: str) -> Optional[Path]:
+        """Return the path of the project env for the given version, or None if it does not exist."""
+        for path, env_version in cls._get_envs():
+            if env_version == version:
+                return path
+        return None
+
+    @classmethod
+    def create_env(cls, version: str) -> Path:
+        """Create the project env for the given version without activating it (i.e. without touching poetry
+        envs.toml) and return its path."""
+        python = shutil.which(f"python{version}")
+        if not python:
+            raise ValueError(f"Could not find a python{version} executable")
+        venv_path = cls.get_new_env_path(version)
+        cls.env_manager.build_venv(
+            venv_path,
+            executable=Path(python),
+            flags=cls.poetry.config.get("virtualenvs.options"),
+        )
+        cls.invalidate_cache()
+        return venv_path
+
+    @classmethod
+    def get_new_env_path(cls, version: str) -> Path:
+        """Return the path poetry would use for a new project env for the given version."""
+        env_name = cls.env_manager.generate_env_name(
+            cls.poetry.package.name, str(cls.poetry.pyproject_path.parent)
+        )
+        return (
+            cls.poetry.config.virtualenvs_path / f"{env_name}-py{version}"
+        ).absolute()
+
     @classmethod
     def activate_env(cls, version: str) -> Path:
-        return PoetryAPI.env_manager.activate(version).path
+        try:
+            return PoetryAPI.env_manager.activate(version).path
+        finally:
+            cls.invalidate_cache()
 
     @classmethod
     def remove_env(cls, version: str) -> Path:
-        return PoetryAPI.env_manager.remove(version).path
+        try:
+            return PoetryAPI.env_manager.remove(version).path
+        finally:
+            cls.invalidate_cache()
 
     @staticmethod
     def _get_version_from_venv(venv: Env) -> str:
@@ -56,4 +149,53 @@ class PoetryAPI:
 
     @classmethod
     def get_available_env_paths(cls) -> List[Path]:
-        return [env.path.absolute() for env in cls.env_manager.list()]
+        return [path for path, _ in cls._get_envs()]
+
+    @classmethod
+    def _get_envs(cls) -> List[Tuple[Path, str]]:
+        """Return the absolute path and the version of every project env. Inspecting an env requires launching its
+        interpreter, so the result is cached."""
+        return cls._cached(
+            "envs",
+            lambda: [
+                (env.path.absolute(), cls._get_version_from_venv(env))
+                for env in cls.env_manager.list()
+            ],
+        )
+
+    @classmethod
+    def invalidate_cache(cls) -> None:
+        """Forget all cached envs discovery results."""
+        cls._cache = {}
+
+    @classmethod
+    def _cached(cls, name: str, builder: Callable[[], T]) -> T:
+        """Return the cached value stored under `name`, building it anew with `builder` if the poetry state changed
+        since it was computed."""
+        key = cls._get_cache_key()
+        cached = cls._cache.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, builder())
+            cls._cache[name] = cached
+        return cast(T, cached[1])
+
+    @classmethod
+    def _get_cache_key(cls) -> CacheKey:
+        """Fingerprint the poetry state envs discovery depends on: the envs.toml file, the venvs folder and the
+        in-project venv, which all change when an env is created, removed or activated, and the VIRTUAL_ENV
+        variable."""
+        venvs_path = cls.poetry.config.virtualenvs_path
+        return (
+            _get_mtime(venvs_path / cls.env_manager.ENVS_FILE),
+            _get_mtime(venvs_path),
+            _get_mtime(cls.poetry.pyproject_path.parent / ".venv"),
+            os.environ.get("VIRTUAL_ENV"),
+        )
+
+
+def _get_mtime(path: Path) -> Optional[int]:
+    """Return the modification time of the given path, or None if it does not exist."""
+    try:
+        return path.lstat().st_mtime_ns
+    except OSError:
+        return None
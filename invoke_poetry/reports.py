@@ -0,0 +1,117 @@
+import json
+import os
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:  # pragma: no cover
+    from invoke_poetry.matrix import MatrixTask
+
+#
+# ABOUT THIS MODULE
+#
+# Machine-readable task matrix reports. Reporters are fed every task as soon as it's concluded, so that an
+# interrupted or crashed matrix still leaves a usable report behind:
+#
+# - JsonLinesReporter appends a JSON object per task to its file (https://jsonlines.org);
+# - JUnitReporter atomically rewrites a JUnit XML file after every task, so that it's always well-formed.
+#
+
+
+class MatrixReporter(ABC):
+    """Base class of the task matrix reporters."""
+
+    @abstractmethod
+    def add_task(self, task: "MatrixTask") -> None:
+        """Report a concluded task."""
+
+    def close(self) -> None:
+        """Conclude the report, freeing resources."""
+
+
+class JsonLinesReporter(MatrixReporter):
+    """Write every task on the given file as a JSON object on its own line. Previous file content is discarded."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file: Optional[IO[str]] = path.open("w")
+
+    def add_task(self, task: "MatrixTask") -> None:
+        if self.file:
+            self.file.write(json.dumps(task.to_dict()) + "\n")
+            self.file.flush()
+
+    def close(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class JUnitReporter(MatrixReporter):
+    """Write all tasks, as test cases of a single test suite, on the given file in the JUnit XML format."""
+
+    def __init__(self, path: Path, suite_name: str = "task_matrix") -> None:
+        self.path = path
+        self.suite_name = suite_name
+        self.tasks: List["MatrixTask"] = []
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._write()
+
+    def add_task(self, task: "MatrixTask") -> None:
+        self.tasks.append(task)
+        self._write()
+
+    def get_xml(self) -> ET.Element:
+        """Return the report XML tree."""
+        from invoke_poetry.matrix import TaskState
+
+        suite = ET.Element("testsuite", name=self.suite_name)
+        counters = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+        total_time = 0.0
+        for task in self.tasks:
+            counters["tests"] += 1
+            total_time += task.stats.wall_time or 0.0
+            case = ET.SubElement(
+                suite,
+                "testcase",
+                name=task.name,
+                classname=self.suite_name,
+                time=f"{task.stats.wall_time or 0.0:.3f}",
+            )
+            if task.state == TaskState.FAILED:
+                counters["failures"] += 1
+                failure = ET.SubElement(
+                    case, "failure", message=_get_failure_message(task)
+                )
+                failure.text = task.error
+            elif task.state == TaskState.INTERRUPTED:
+                counters["errors"] += 1
+                ET.SubElement(case, "error", message="interrupted by the user")
+            elif task.state == TaskState.SKIPPED:
+                counters["skipped"] += 1
+                ET.SubElement(case, "skipped")
+            elif task.state == TaskState.CANCELLED:
+                counters["skipped"] += 1
+                ET.SubElement(
+                    case, "skipped", message="cancelled after too many failures"
+                )
+        for key, value in counters.items():
+            suite.set(key, str(value))
+        suite.set("time", f"{total_time:.3f}")
+        return suite
+
+    def _write(self) -> None:
+        """Atomically replace the report file with an updated one."""
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        ET.ElementTree(self.get_xml()).write(
+            tmp_path, encoding="utf-8", xml_declaration=True
+        )
+        os.replace(tmp_path, self.path)
+
+
+def _get_failure_message(task: "MatrixTask") -> str:
+    """Return a short failure message for the given task."""
+    if task.return_code is not None:
+        return f"exited with return code {task.return_code}"
+    return "failed"
@@ -12,6 +12,11 @@ class Settings:
     supported_python_versions: ClassVar[Iterable[str]]
     venv_link_path: ClassVar[Path]
     poetry_bin: ClassVar[str]
+    use_poetry_run: ClassVar[bool] = True
+    env_templates_path: ClassVar[Path] = (
+        Path.home() / ".cache" / "invoke-poetry" / "templates"
+    )
+    state_path: ClassVar[Path] = Path(".invoke-poetry")
 
     @staticmethod
     def init(
@@ -20,6 +25,9 @@ class Settings:
         install_project_dependencies_hook: Optional[Callable[..., Any]] = None,
         poetry_bin: Optional[str] = None,
         venv_link_path: Optional[str] = None,
+        use_poetry_run: bool = True,
+        env_templates_path: Optional[str] = None,
+        state_path: Optional[str] = None,
     ) -> None:
         Settings.default_python_version = default_python_version
         Settings.supported_python_versions = supported_python_versions
@@ -28,6 +36,11 @@ class Settings:
         Settings.venv_link_path = (
             Path(venv_link_path) if venv_link_path else Path(".venv")
         )
+        Settings.use_poetry_run = use_poetry_run
+        if env_templates_path:
+            Settings.env_templates_path = Path(env_templates_path)
+        if state_path:
+            Settings.state_path = Path(state_path)
 
         if install_project_dependencies_hook:
             Settings.install_project_dependencies_hook = (
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import subprocess
+from hashlib import sha256
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from invoke_poetry.settings import Settings
+from invoke_poetry.utils import get_callable_identity, get_files_hash
+
+#
+# ABOUT THIS MODULE
+#
+# A template is a snapshot of a fully installed venv, stored in `Settings.env_templates_path` and keyed by the
+# interpreter, the project lock and the install hook. New identical venvs can be materialized from it with hardlinks
+# in a fraction of the time needed to build and populate them.
+#
+# Files in a template are hardlinked to the venvs it was saved from or cloned into: they must never be modified in
+# place (pip and poetry never do, they replace files).
+#
+
+# File saved in each template, describing it
+TEMPLATE_INFO_FILE = "invoke-poetry-template.json"
+
+# Files affecting the content of an installed venv
+PROJECT_FILES = [Path("pyproject.toml"), Path("poetry.lock")]
+
+
+def get_template_key(python_version: str) -> Optional[str]:
+    """Return the key of the template matching the given python version in the current project state, or None if no
+    suitable interpreter can be found."""
+    python = shutil.which(f"python{python_version}")
+    if not python:
+        return None
+    full_version = subprocess.check_output(
+        [python, "-c", "import platform; print(platform.python_version())"],
+        text=True,
+    ).strip()
+    key_hash = sha256()
+    key_hash.update(os.path.realpath(python).encode())
+    key_hash.update(
+        get_callable_identity(Settings.install_project_dependencies_hook).encode()
+    )
+    key_hash.update(get_files_hash(PROJECT_FILES).encode())
+    return f"py{full_version}-{key_hash.hexdigest()[:16]}"
+
+
+def get_template_path(key: str) -> Path:
+    """Return the folder of the template with the given key."""
+    return Settings.env_templates_path / key
+
+
+def is_template_available(key: str) -> bool:
+    """Return True if a complete template with the given key exists."""
+    return (get_template_path(key) / TEMPLATE_INFO_FILE).is_file()
+
+
+def save_template(venv_path: Path, key: str) -> bool:
+    """Snapshot the given fully installed venv as the template with the given key, if one is not there already.
+    Return True if the template was saved."""
+    if is_template_available(key):
+        return False
+    template_path = get_template_path(key)
+    template_path.parent.mkdir(parents=True, exist_ok=True)
+    # build the template aside, then move it in place in a single step
+    tmp_path = template_path.with_name(f".{key}.{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    _link_tree(venv_path, tmp_path)
+    (tmp_path / TEMPLATE_INFO_FILE).write_text(
+        json.dumps({"venv_path": str(venv_path.absolute())})
+    )
+    try:
+        tmp_path.rename(template_path)
+    except OSError:
+        # someone else saved the same template in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return False
+    return True
+
+
+def clone_template(key: str, venv_path: Path) -> bool:
+    """Materialize a new venv in `venv_path` from the template with the given key, fixing all paths pointing to the
+    venv the template was saved from. Return False if no such template exists."""
+    if not is_template_available(key) or venv_path.exists():
+        return False
+    template_path = get_template_path(key)
+    info = json.loads((template_path / TEMPLATE_INFO_FILE).read_text())
+    replace = (info["venv_path"], str(venv_path.absolute()))
+
+    tmp_path = venv_path.with_name(f".{venv_path.name}.{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    _link_tree(template_path, tmp_path, replace=replace)
+    (tmp_path / TEMPLATE_INFO_FILE).unlink()
+    for file in _get_files_with_paths(tmp_path):
+        _replace_in_file(file, *replace)
+    tmp_path.rename(venv_path)
+    return True
+
+
+def remove_template(key: str) -> None:
+    """Delete the template with the given key, if it exists."""
+    shutil.rmtree(get_template_path(key), ignore_errors=True)
+
+
+def _link_tree(
+    source: Path, destination: Path, replace: Optional[Tuple[str, str]] = None
+) -> None:
+    """Recreate the `source` folder tree in `destination`, hardlinking files (or copying them if hardlinks are not
+    possible) and recreating symlinks. Symlinks targets are adjusted with `replace`, if given.
+    """
+    for root, dirs, files in os.walk(source):
+        root_path = Path(root)
+        target_root = destination / root_path.relative_to(source)
+        target_root.mkdir(parents=True, exist_ok=True)
+        for name in dirs + files:
+            entry = root_path / name
+            target = target_root / name
+            if entry.is_symlink():
+                link = os.readlink(entry)
+                if replace and link.startswith(replace[0]):
+                    link = replace[1] + link[len(replace[0]) :]
+                target.symlink_to(link)
+            elif name in files:
+                try:
+                    os.link(entry, target)
+                except OSError:
+                    shutil.copy2(entry, target)
+        # do not walk into symlinked folders, they were recreated as links
+        dirs[:] = [name for name in dirs if not (root_path / name).is_symlink()]
+
+
+def _get_files_with_paths(venv_path: Path) -> Iterator[Path]:
+    """Yield the venv files that can contain its absolute path: scripts, activators and the venv configuration."""
+    yield venv_path / "pyvenv.cfg"
+    for file in (venv_path / "bin").iterdir():
+        if file.is_file() and not file.is_symlink():
+            yield file
+    yield from venv_path.glob("lib/python*/site-packages/*.pth")
+
+
+def _replace_in_file(file: Path, old: str, new: str) -> None:
+    """Replace every occurrence of `old` with `new` in the given file. The file is replaced rather than modified in
+    place, so that any hardlink to it is broken."""
+    if not file.is_file():
+        return
+    content = file.read_bytes()
+    if old.encode() not in content:
+        return
+    tmp_file = file.with_name(f".{file.name}.tmp")
+    tmp_file.write_bytes(content.replace(old.encode(), new.encode()))
+    shutil.copymode(file, tmp_file)
+    os.replace(tmp_file, file)
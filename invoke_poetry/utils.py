@@ -1,10 +1,45 @@
+import hashlib
+import json
+import os
 import re
 import signal
+import subprocess
+import threading
+import time
 from contextlib import contextmanager
-from typing import Any, Callable, Generator, List, Pattern, Union
+from pathlib import Path
+from stat import S_ISREG
+from types import ModuleType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
 
 delayed_interrupt = False
 
+# Size of the reads used to hash files
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# Functions called with the pid of every spawned child process, see `on_subprocess_spawn`
+_spawn_listeners: List[Callable[[int], None]] = []
+# Functions called with the pid and the resource usage of every reaped child process, see `on_subprocess_exit`
+_exit_listeners: List[Callable[[int, Any], None]] = []
+# The functions replaced by the spawn and exit hooks, restored when the last listener is gone
+_spawn_originals: Dict[str, Any] = {}
+_exit_originals: Dict[str, Any] = {}
+_hooks_lock = threading.Lock()
+# Flags the threads looking for processes to kill, so that the processes they spawn to do so are not reported to
+# spawn listeners
+_killing = threading.local()
+
 
 class IsInterrupted:
     by_user = False
@@ -19,6 +54,11 @@ def delay_keyboard_interrupt() -> Generator[None, None, None]:
     def _interrupt(_: Any, __: Any) -> None:
         IsInterrupted.delayed = True
 
+    if not in_main_thread():
+        # signal handlers can only be set from the main thread, which is the only one receiving SIGINTs anyway
+        yield
+        return
+
     original = signal.signal(signal.SIGINT, _interrupt)
     yield
     signal.signal(signal.SIGINT, original)
@@ -33,11 +73,27 @@ def flag_user_interrupt(_: Any, __: Any) -> None:
     raise KeyboardInterrupt
 
 
+def flag_user_interrupt_only(_: Any, __: Any) -> None:
+    """Used as signal handler, flag a user interrupt in the `IsInterrupted` class without raising anything. Useful
+    when the interruption must be handled by polling the flag instead."""
+    IsInterrupted.by_user = True
+
+
 def capture_sigint(handler: Callable[[Any, Any], None] = flag_user_interrupt) -> None:
-    """Capture a sigint and execute the given handler. By default, call `flag_user_interrupt`."""
+    """Capture a sigint and execute the given handler. By default, call `flag_user_interrupt`.
+
+    It's a no-op when called outside the main thread, since only the main thread can set signal handlers.
+    """
+    if not in_main_thread():
+        return
     signal.signal(signal.SIGINT, handler)
 
 
+def in_main_thread() -> bool:
+    """Return True if the caller is running in the main thread."""
+    return threading.current_thread() is threading.main_thread()
+
+
 def natural_sort_key(
     string: str, _nsre: Pattern[str] = re.compile(r"(\d+)")
 ) -> List[Union[str, int, Any]]:
@@ -45,3 +101,293 @@ def natural_sort_key(
     return [
         int(text) if text.isdigit() else text.lower() for text in _nsre.split(string)
     ]
+
+
+def get_files_hash(files: Iterable[Path], memo_file: Optional[Path] = None) -> str:
+    """Return a hash based on the content of the given files. Missing files are accounted for, but do not raise.
+
+    Digests of single files can be memoized in `memo_file`, keyed on their path, size and modification time, so that
+    unchanged files are not read again by later calls with the same memo file."""
+    memo = _load_digests_memo(memo_file) if memo_file else {}
+    seen: Dict[str, List[Any]] = {}
+    files_hash = hashlib.blake2b(digest_size=32)
+    for file in files:
+        files_hash.update(str(file).encode() + b"\0")
+        try:
+            stat = file.stat()
+        except OSError:
+            stat = None
+        if not stat or not S_ISREG(stat.st_mode):
+            files_hash.update(b"\0missing")
+            continue
+        key = str(file.absolute())
+        entry = memo.get(key)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            digest = entry[2]
+        else:
+            digest = get_file_digest(file)
+        # files modified right now may change again within the mtime granularity, unnoticed: do not memoize them
+        if time.time_ns() - stat.st_mtime_ns > 2 * 10**9:
+            seen[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        files_hash.update(digest.encode())
+    if memo_file and seen != memo:
+        _save_digests_memo(memo_file, seen)
+    return files_hash.hexdigest()
+
+
+def get_file_digest(file: Path) -> str:
+    """Return the hex digest of the given file content."""
+    file_hash = hashlib.blake2b(digest_size=32)
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(file, "rb", buffering=0) as file_reader:
+        while size := file_reader.readinto(buffer):
+            file_hash.update(view[:size])
+    return file_hash.hexdigest()
+
+
+def _load_digests_memo(memo_file: Path) -> Dict[str, List[Any]]:
+    """Load the file digests memo, see `get_files_hash`."""
+    try:
+        return dict(json.loads(memo_file.read_text()))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_digests_memo(memo_file: Path, memo: Dict[str, List[Any]]) -> None:
+    """Atomically save the file digests memo, see `get_files_hash`."""
+    try:
+        memo_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = memo_file.with_name(f".{memo_file.name}.{os.getpid()}")
+        tmp_file.write_text(json.dumps(memo))
+        os.replace(tmp_file, memo_file)
+    except OSError:
+        # the memo is only an optimization
+        pass
+
+
+def get_callable_identity(func: Callable[..., Any]) -> str:
+    """Return a string identifying the given function across runs, like 'module.qualified_name'."""
+    module = getattr(func, "__module__", None)
+    name = getattr(func, "__qualname__", None) or getattr(func, "__name__", repr(func))
+    return f"{module}.{name}"
+
+
+def stable_repr(value: Any) -> str:
+    """Return a representation of the given value that does not change across runs: objects without a meaningful
+    representation (like an invoke Context) are represented by their type only."""
+    if isinstance(value, (str, int, float, bool, type(None), Path)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return f"[{', '.join(stable_repr(item) for item in value)}]"
+    if isinstance(value, dict):
+        items = sorted(f"{stable_repr(k)}: {stable_repr(v)}" for k, v in value.items())
+        return f"{{{', '.join(items)}}}"
+    if callable(value):
+        return get_callable_identity(value)
+    return f"<{type(value).__module__}.{type(value).__qualname__}>"
+
+
+@contextmanager
+def on_subprocess_spawn(listener: Callable[[int], None]) -> Generator[None, None, None]:
+    """Call `listener` with the pid of every child process spawned while the code block runs, from any thread. Both
+    `subprocess` (used by invoke, poetry and most libraries) and `pty.fork` (used by invoke with `pty=True`) spawns
+    are detected. The listener is called in the thread that spawned the process.
+
+    The spawning functions are only wrapped while there are listeners."""
+    with _hooks_lock:
+        if not _spawn_listeners:
+            _install_spawn_hooks()
+        _spawn_listeners.append(listener)
+    try:
+        yield
+    finally:
+        with _hooks_lock:
+            _spawn_listeners.remove(listener)
+            if not _spawn_listeners:
+                _remove_spawn_hooks()
+
+
+@contextmanager
+def on_subprocess_exit(
+    listener: Callable[[int, Any], None]
+) -> Generator[bool, None, None]:
+    """Call `listener` with the pid and the resource usage (a `resource.struct_rusage`, which accounts for the process
+    and its reaped descendants) of every child process reaped while the code block runs, from any thread. Yield
+    whether reaped processes can be tracked at all: they can't on platforms lacking `os.wait4` (like Windows).
+
+    The reaping functions are only wrapped while there are listeners."""
+    if not hasattr(os, "wait4"):
+        yield False
+        return
+    with _hooks_lock:
+        if not _exit_listeners:
+            _install_exit_hooks()
+        _exit_listeners.append(listener)
+    try:
+        yield True
+    finally:
+        with _hooks_lock:
+            _exit_listeners.remove(listener)
+            if not _exit_listeners:
+                _remove_exit_hooks()
+
+
+def _notify_spawn(pid: int) -> None:
+    """Notify all listeners that a child process was spawned."""
+    if getattr(_killing, "active", False):
+        return
+    for listener in list(_spawn_listeners):
+        listener(pid)
+
+
+def _get_pty_module() -> Optional[ModuleType]:
+    """Return the pty module, or None on platforms lacking it (like Windows)."""
+    try:
+        import pty
+    except ImportError:  # pragma: no cover
+        return None
+    return pty
+
+
+def _install_spawn_hooks() -> None:
+    """Wrap the functions used to spawn processes, so that listeners get notified."""
+    original_execute_child = subprocess.Popen._execute_child  # type: ignore[attr-defined]
+
+    def _execute_child(
+        self: "subprocess.Popen[Any]", *args: Any, **kwargs: Any
+    ) -> None:
+        original_execute_child(self, *args, **kwargs)
+        _notify_spawn(self.pid)
+
+    _spawn_originals["execute_child"] = original_execute_child
+    subprocess.Popen._execute_child = _execute_child  # type: ignore[attr-defined]
+
+    pty = _get_pty_module()
+    if pty:
+        original_fork = pty.fork
+
+        def _fork() -> Tuple[int, int]:
+            pid, fd = original_fork()
+            if pid != 0:
+                # only notify in the parent process
+                _notify_spawn(pid)
+            return pid, fd
+
+        _spawn_originals["fork"] = original_fork
+        pty.fork = _fork  # type: ignore[attr-defined]
+
+
+def _remove_spawn_hooks() -> None:
+    """Restore the functions wrapped by `_install_spawn_hooks`."""
+    subprocess.Popen._execute_child = _spawn_originals.pop("execute_child")  # type: ignore[attr-defined]
+    pty = _get_pty_module()
+    if pty and "fork" in _spawn_originals:
+        pty.fork = _spawn_originals.pop("fork")  # type: ignore[attr-defined]
+
+
+def _install_exit_hooks() -> None:
+    """Wrap the functions used to reap processes, so that listeners get notified."""
+    original_waitpid = os.waitpid
+
+    def _waitpid(pid: int, options: int) -> Tuple[int, int]:
+        # wait4 works like waitpid, but also returns the resource usage of the reaped process
+        reaped_pid, status, rusage = os.wait4(pid, options)
+        if reaped_pid != 0:
+            for listener in list(_exit_listeners):
+                listener(reaped_pid, rusage)
+        return reaped_pid, status
+
+    original_internal_poll = subprocess.Popen._internal_poll  # type: ignore[attr-defined]
+
+    def _internal_poll(self: "subprocess.Popen[Any]", *args: Any, **kwargs: Any) -> Any:
+        # Popen.poll binds os.waitpid as a default argument value, it must be replaced explicitly
+        kwargs.setdefault("_waitpid", _waitpid)
+        return original_internal_poll(self, *args, **kwargs)
+
+    _exit_originals["waitpid"] = original_waitpid
+    _exit_originals["internal_poll"] = original_internal_poll
+    subprocess.Popen._internal_poll = _internal_poll  # type: ignore[attr-defined]
+    # both subprocess and invoke reap their processes with os.waitpid
+    os.waitpid = _waitpid
+
+
+def _remove_exit_hooks() -> None:
+    """Restore the functions wrapped by `_install_exit_hooks`."""
+    os.waitpid = _exit_originals.pop("waitpid")
+    subprocess.Popen._internal_poll = _exit_originals.pop("internal_poll")  # type: ignore[attr-defined]
+
+
+def get_return_code(exception: BaseException) -> Optional[int]:
+    """Return the return code of the failed command, if the exception carries its result like invoke UnexpectedExit
+    does."""
+    return getattr(getattr(exception, "result", None), "return_code", None)
+
+
+def describe_exception(exception: BaseException) -> str:
+    """Return a description of the exception, including its type."""
+    name = type(exception).__name__
+    return f"{name}: {exception}" if str(exception) else name
+
+
+def kill_process_tree(pid: int) -> None:
+    """Terminate the given process along with its descendants, like the commands launched by a shell. The whole
+    process group is terminated if the process leads one (as commands run in a pty do).
+    """
+    try:
+        if os.getpgid(pid) == pid:
+            os.killpg(pid, signal.SIGTERM)
+            return
+    except OSError:
+        # the process is already gone
+        return
+    # find the descendants first, since they are adopted by init once their parent is gone
+    for process in [pid, *_get_descendants(pid)]:
+        try:
+            os.kill(process, signal.SIGTERM)
+        except OSError:
+            pass
+
+
+def _get_descendants(pid: int) -> List[int]:
+    """Return the pids of the descendants of the given process, parents first."""
+    children: Dict[int, List[int]] = {}
+    for child, parent in _get_parent_pids():
+        children.setdefault(parent, []).append(child)
+    descendants: List[int] = []
+    parents = [pid]
+    while parents:
+        parents = [child for parent in parents for child in children.get(parent, [])]
+        descendants.extend(parents)
+    return descendants
+
+
+def _get_parent_pids() -> List[Tuple[int, int]]:
+    """Return the pid and the parent pid of every running process. Processes are read from /proc when available,
+    from `ps` otherwise."""
+    if not Path("/proc/self/stat").exists():
+        _killing.active = True
+        try:
+            output = subprocess.run(
+                ["ps", "-A", "-o", "pid=", "-o", "ppid="],
+                capture_output=True,
+                text=True,
+            ).stdout
+        finally:
+            _killing.active = False
+        return [
+            (int(pid), int(ppid))
+            for pid, ppid in (line.split() for line in output.splitlines() if line)
+        ]
+    processes = []
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat") as stat:
+                # the command name, between parentheses, may contain spaces
+                fields = stat.read().rpartition(")")[2].split()
+        except OSError:
+            continue
+        processes.append((int(entry.name), int(fields[1])))
+    return processes
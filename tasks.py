@@ -1,9 +1,13 @@
+import json
+import shutil
 from pathlib import Path
 from typing import Optional
 
 from invoke import Context, Result  # type: ignore[attr-defined]
 
 from invoke_poetry import (
+    MatrixBuilder,
+    RetryPolicy,
     TaskMatrix,
     add_sub_collection,
     get_additional_args_string,
@@ -12,7 +16,9 @@ from invoke_poetry import (
     task_matrix,
 )
 from invoke_poetry.contrib.act import ActCachedJobController
+from invoke_poetry.history import DurationHistory
 from invoke_poetry.logs import error, info, ok, warn
+from invoke_poetry.matrix_builder import parse_shard
 
 # Project info
 project_folder = "invoke_poetry"
@@ -41,19 +47,22 @@ def checks(
     c: Context,
     _filter: Optional[str] = None,
     python_version: str = default_python_version,
+    fail_fast: bool = False,
+    cache: bool = False,
 ) -> TaskMatrix:
     """Run several formatting, linting and static type checks.
 
     A subset of checks to perform can be specified with the `--filter` flag as a list of names separated
-    by a comma (e.g. mypy,black).
+    by a comma (e.g. mypy,black). With `--fail-fast` remaining checks are skipped after the first failed one, while
+    with `--cache` checks that passed are not launched again until some project file changes.
     By default the checks are launched in the dev environment; if needed, a different one can be specified by the
     `--python-version` flag.
     """
     checklist = {
-        "black": f"black --check {project_folder} {test_folder} tasks.py",
-        "isort": f"isort --check {project_folder} {test_folder} tasks.py",
-        "flake8": f"flake8 {project_folder}",
-        "mypy": f"mypy {project_folder} tasks.py",
+        "black": f"black --check {project_folder} {test_folder} benchmarks tasks.py",
+        "isort": f"isort --check {project_folder} {test_folder} benchmarks tasks.py",
+        "flake8": f"flake8 {project_folder} benchmarks",
+        "mypy": f"mypy {project_folder} benchmarks tasks.py",
     }
 
     if _filter:
@@ -73,6 +82,8 @@ def checks(
             ),
             task_names=checklist.keys(),
             print_steps=True,
+            fail_fast=fail_fast,
+            cache=cache,
         )
         results.print_report()
         results.exit_with_rc()
@@ -96,16 +107,46 @@ def test_dev(
 
 
 @task_t(name="matrix")
-def test_matrix(c: Context) -> TaskMatrix:
-    """Launch the test suite with all supported python version."""
+def test_matrix(
+    c: Context,
+    fail_fast: bool = False,
+    cache: bool = False,
+    retries: int = 0,
+    shard: Optional[str] = None,
+    durations: Optional[str] = None,
+    capture: bool = False,
+) -> TaskMatrix:
+    """Launch the test suite with all supported python version. With `--fail-fast` remaining versions are skipped
+    after the first failed one, while with `--cache` versions that passed are not tested again until some project
+    file changes. Failed versions can be relaunched up to `--retries` times. To split versions among CI machines,
+    every one of them can launch its own `--shard` (e.g. 2/4, the second of four shards). Shards are balanced using
+    the durations of previous runs if `--durations` points to a history file shared by all machines (e.g. restored
+    from the CI cache), by version count otherwise. With `--capture` the output of every version goes to its own log
+    file, and only the last lines of failed ones are shown.
+    """
+    matrix = MatrixBuilder(axes={"python": reversed(supported_python_versions)})
+    expected_durations = (
+        DurationHistory(Path(durations)).get_durations(matrix.get_names())
+        if durations
+        else None
+    )
     results = task_matrix(
         hook=test_dev,
-        hook_args_builder=lambda name: (
-            [c],
-            {"python_version": name, "rollback_env": False},
+        hook_args_builder=matrix.get_hook_args_builder(
+            lambda entry: (
+                [c],
+                {"python_version": entry["python"], "rollback_env": False},
+            )
+        ),
+        task_names=matrix.get_names(
+            parse_shard(shard) if shard else None, expected_durations
         ),
-        task_names=reversed(supported_python_versions),
         print_steps=True,
+        fail_fast=fail_fast,
+        cache=cache,
+        retry=RetryPolicy(count=retries, backoff=1),
+        history=True,
+        capture=capture,
     )
     results.print_report()
     results.exit_with_rc()
@@ -144,6 +185,39 @@ def test_cov_publish(c: Context) -> Optional[Result]:
     return c.run("coveralls")
 
 
+#
+# BENCHMARKS
+#
+@task
+def bench(
+    c: Context,
+    repeat: int = 5,
+    output: Optional[str] = None,
+    compare: Optional[str] = None,
+) -> None:
+    """Benchmark the invoke_poetry hot paths in a throwaway poetry project, with a venv for every available supported
+    python version.
+
+    Timings can be saved as JSON with `--output` and compared with a previous run with `--compare`.
+    """
+    from benchmarks.suite import (
+        get_json_report,
+        get_report,
+        load_json_report,
+        run_suite,
+    )
+
+    versions = [v for v in supported_python_versions if shutil.which(f"python{v}")]
+    info(f"Running benchmarks with python {', '.join(versions)}...")
+    results = run_suite(versions, repeat=repeat)
+    baseline = load_json_report(Path(compare)) if compare else None
+    for line in get_report(results, baseline):
+        print(line)
+    if output:
+        Path(output).write_text(json.dumps(get_json_report(results), indent=2))
+        ok(f"Results saved in {output}")
+
+
 #
 # PYPI
 #
@@ -274,6 +348,7 @@ act = ActCachedJobController(
     cache_job_name="layer",
     docker_cache_tag_prefix="carlodepieri/act-invoke-poetry",
     docker_base_tag="catthehacker/ubuntu:act-latest",
+    cache_retention=3,
 )
 
 
@@ -0,0 +1,363 @@
+import json
+import os
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from invoke import Config, Context
+
+from invoke_poetry import utils
+from invoke_poetry.contrib.act import ActCachedJobController
+from invoke_poetry.contrib.docker import (
+    DockerCliBackend,
+    DockerSocketBackend,
+    get_docker_backend,
+)
+
+
+class FakeDockerEngine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A tiny fake of the Docker Engine API, serving some containers and images on a unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path) -> None:
+        self.containers = {
+            "a" * 64: "/act-dev-build-1",
+            "b" * 64: "/act-cache-cache-1",
+        }
+        self.images = {
+            "sha256:" + "c" * 64: ["repo/act-dev-build-0123:latest"],
+            "sha256:" + "d" * 64: ["repo/other:latest"],
+        }
+        self.requests = []
+        self.connections = 0
+        # the number of next requests to drop, closing the connection without answering
+        self.drops = 0
+        super().__init__(str(socket_path), FakeDockerEngineHandler)
+
+    def handle_error(self, *_) -> None:
+        # clients closing their connection are fine
+        pass
+
+
+class FakeDockerEngineHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeDockerEngine
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *_) -> None:
+        pass
+
+    def drop(self) -> bool:
+        """Close the connection without answering, if the request should be dropped."""
+        if self.server.drops:
+            self.server.drops -= 1
+            self.close_connection = True
+            return True
+        return False
+
+    def reply(self, status: int, body=None) -> None:
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        self.server.requests.append(("GET", url.path))
+        if self.drop():
+            return
+        filters = json.loads(parse_qs(url.query).get("filters", ["{}"])[0])
+        if url.path == "/_ping":
+            self.reply(200)
+        elif url.path == "/containers/json":
+            prefix = filters["name"][0].replace("^/?", "/")
+            self.reply(
+                200,
+                [
+                    {"Id": i, "Names": [n]}
+                    for i, n in self.server.containers.items()
+                    if n.startswith(prefix)
+                ],
+            )
+        elif url.path == "/images/json":
+            prefix = filters["reference"][0].rstrip("*")
+            self.reply(
+                200,
+                [
+                    {"Id": i, "RepoTags": tags, "Size": 1000}
+                    for i, tags in self.server.images.items()
+                    if tags[0].startswith(prefix)
+                ],
+            )
+        else:
+            self.reply(404, {"message": "not found"})
+
+    def do_DELETE(self) -> None:
+        url = urlparse(self.path)
+        self.server.requests.append(("DELETE", url.path))
+        kind, entry_id = url.path.strip("/").split("/")
+        entries = self.server.containers if kind == "containers" else self.server.images
+        for full_id in list(entries):
+            if full_id.split(":")[-1].startswith(entry_id):
+                del entries[full_id]
+                return self.reply(204) if kind == "containers" else self.reply(200, [])
+        self.reply(404, {"message": f"No such {kind[:-1]}: {entry_id}"})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        self.server.requests.append(("POST", url.path))
+        query = parse_qs(url.query)
+        if self.drop():
+            return
+        if url.path == "/commit":
+            self.server.images["sha256:" + "e" * 64] = [
+                f"{query['repo'][0]}:{query['tag'][0]}"
+            ]
+            self.reply(201, {"Id": "sha256:" + "e" * 64})
+        else:
+            self.reply(404, {"message": "not found"})
+
+
+# language=python
+FAKE_DOCKER_CLI = """
+import json
+import sys
+from pathlib import Path
+
+# the containers and images ids, and the ids of the ones that can't be deleted mapped to the child image to blame
+state_file = Path(__file__).with_name("state.json")
+state = json.loads(state_file.read_text())
+command, *args = sys.argv[1:]
+kind = "containers" if command in ["ps", "rm"] else "images"
+if command in ["ps", "images"]:
+    print("\\n".join(entry_id[:12] for entry_id in state[kind]))
+    sys.exit(0)
+failed = False
+for arg in args:
+    matches = [i for i in state[kind] if i.startswith(arg)]
+    if not arg.startswith("-"):
+        if not matches or arg in state["locked"]:
+            child = state["locked"].get(arg, "")
+            print(f"Error response from daemon: conflict: unable to delete {arg} - child image {child}", file=sys.stderr)
+            failed = True
+        else:
+            state[kind].remove(matches[0])
+state_file.write_text(json.dumps(state))
+sys.exit(1 if failed else 0)
+"""
+
+
+@pytest.fixture
+def docker_cli(tmp_path, monkeypatch):
+    """Put a fake docker CLI, keeping its state in a JSON file, first on the PATH. Return its state file."""
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    docker = bin_path / "docker"
+    docker.write_text(f"#!{sys.executable}\n{FAKE_DOCKER_CLI}")
+    docker.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+    return bin_path / "state.json"
+
+
+@pytest.fixture
+def docker_engine(tmp_path):
+    """Start a fake docker engine on a unix socket."""
+    server = FakeDockerEngine(tmp_path / "docker.sock")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def act_builder(docker_engine, tmp_path):
+    """Return a function building act controllers which use the fake docker engine."""
+
+    def builder(**kwargs) -> ActCachedJobController:
+        return ActCachedJobController(
+            job_file=Path("dev.yml"),
+            job_name="build",
+            cache_file=kwargs.pop("cache_file", Path("cache.yml")),
+            cache_job_name="cache",
+            docker_base_tag="base",
+            docker_cache_tag_prefix="repo/act",
+            backend=DockerSocketBackend(Path(docker_engine.server_address)),
+            cache_index_path=tmp_path / "index",
+            **kwargs,
+        )
+
+    return builder
+
+
+@pytest.fixture
+def act(act_builder):
+    """Return an act controller using the fake docker engine."""
+    return act_builder()
+
+
+class TestAnActJobController:
+    """Test: An act job controller..."""
+
+    def test_should_pick_the_socket_backend_when_the_daemon_answers(
+        self, docker_engine, tmp_path
+    ):
+        """An act job controller should pick the socket backend when the daemon answers."""
+        backend = get_docker_backend(None, Path(docker_engine.server_address))
+        assert isinstance(backend, DockerSocketBackend)
+        backend = get_docker_backend(None, tmp_path / "missing.sock")
+        assert isinstance(backend, DockerCliBackend)
+
+    def test_should_list_and_delete_resources_through_the_docker_socket(
+        self, act, docker_engine
+    ):
+        """An act job controller should list and delete resources through the docker socket, on a single
+        connection."""
+        assert act.list_job_container_ids(None) == ["a" * 12]
+        assert act.list_cache_container_ids(None) == ["b" * 12]
+        assert act.list_cache_images(None) == [("0123", "c" * 12, 1000)]
+
+        assert act.delete_job_containers(None) == ["a" * 12]
+        assert act.delete_containers(None, ["missing"]) == []
+        assert act.delete_cache_images(None) == ["c" * 12]
+        assert act.list_job_container_ids(None) == []
+        assert act.list_cache_images(None) == []
+        assert docker_engine.connections == 1
+
+    def test_should_commit_cache_containers_through_the_docker_socket(
+        self, act, docker_engine
+    ):
+        """An act job controller should commit cache containers through the docker socket."""
+        act.get_backend(None).commit("b" * 12, "repo/act-dev-build-4567")
+        assert ("POST", "/commit") in docker_engine.requests
+        assert ("4567", "e" * 12, 1000) in act.list_cache_images(None)
+
+    def test_should_only_send_idempotent_requests_again_when_the_daemon_disconnects(
+        self, act, docker_engine
+    ):
+        """An act job controller should only send idempotent requests again when the daemon disconnects."""
+        backend = act.get_backend(None)
+        docker_engine.drops = 1
+        assert act.list_job_container_ids(None) == ["a" * 12]
+        assert docker_engine.requests.count(("GET", "/containers/json")) == 2
+
+        docker_engine.drops = 1
+        with pytest.raises(ConnectionError):
+            backend.commit("b" * 12, "repo/act-dev-build-4567")
+        assert docker_engine.requests.count(("POST", "/commit")) == 1
+
+    def test_should_report_the_resources_actually_deleted_through_the_docker_cli(
+        self, docker_cli
+    ):
+        """An act job controller should report the resources actually deleted through the docker CLI, when some of
+        them can't be deleted."""
+        # the error message of an image names another one, which is deleted
+        docker_cli.write_text(
+            json.dumps(
+                {
+                    "containers": ["a" * 64, "b" * 64],
+                    "images": ["1" * 64, "2" * 64, "3" * 64],
+                    "locked": {"1" * 12: "2" * 12},
+                }
+            )
+        )
+        backend = DockerCliBackend(Context(Config({"run": {"in_stream": False}})))
+        assert backend.delete_containers(["a" * 12, "b" * 12]) == ["a" * 12, "b" * 12]
+        assert backend.delete_images(["1" * 12, "2" * 12, "3" * 12]) == [
+            "2" * 12,
+            "3" * 12,
+        ]
+        assert json.loads(docker_cli.read_text())["images"] == ["1" * 64]
+
+    @pytest.mark.parametrize(
+        "policy, kept",
+        [
+            ({}, ["current"]),
+            ({"cache_retention": 3}, ["current", "recent", "old"]),
+            ({"cache_retention": 3, "max_cache_size": 2500}, ["current", "recent"]),
+        ],
+    )
+    def test_should_evict_least_recently_used_cache_images(
+        self, act_builder, docker_engine, tmp_path, monkeypatch, policy, kept
+    ):
+        """An act job controller should evict the least recently used cache images beyond its retention policy."""
+        monkeypatch.chdir(tmp_path)
+        Path("poetry.lock").write_text("lock")
+        Path("pyproject.toml").write_text("pyproject")
+        Path("cache.yml").write_text("cache")
+        act = act_builder(**policy)
+        current = act.get_cache_key()
+        images = {"current": current, "recent": "1", "old": "2", "oldest": "3"}
+        docker_engine.images = {
+            "sha256:"
+            + str(i) * 64: [f"{act.docker_cache_tag_prefix}-{lock_hash}:latest"]
+            for i, lock_hash in enumerate(images.values())
+        }
+        # the recent one was used after the old one, the oldest one was never used
+        act._mark_cache_image_used("2")
+        act._mark_cache_image_used("1")
+
+        assert act.get_cache_image("build", None) == act._get_cache_tag(current)
+        assert [image.lock_hash for image in act.list_cache_images(None)] == [
+            images[name] for name in kept
+        ]
+
+    def test_should_key_cache_images_on_absolute_input_files(
+        self, act_builder, tmp_path, monkeypatch
+    ):
+        """An act job controller should key cache images on input files given by absolute paths or patterns."""
+        project = tmp_path / "project"
+        project.mkdir()
+        monkeypatch.chdir(project)
+        Path("poetry.lock").write_text("lock")
+        Path("pyproject.toml").write_text("project")
+        cache_file = tmp_path / "cache.yml"
+        cache_file.write_text("cache")
+        (tmp_path / "other.yml").write_text("other")
+        act = act_builder(cache_file=cache_file)
+        assert act.cache_inputs[-1] == str(cache_file)
+        key = act.get_cache_key()
+
+        cache_file.write_text("changed")
+        assert act.get_cache_key() != key
+
+        act.cache_inputs = [str(tmp_path / "*.yml")]
+        key = act.get_cache_key()
+        (tmp_path / "other.yml").write_text("changed")
+        assert act.get_cache_key() != key
+
+    def test_should_key_cache_images_on_all_input_files(
+        self, act_builder, tmp_path, monkeypatch
+    ):
+        """An act job controller should key cache images on all input files, reading only changed ones."""
+        monkeypatch.chdir(tmp_path)
+        Path("docker").mkdir()
+        files = [Path("poetry.lock"), Path("docker/Dockerfile"), Path("docker/b")]
+        for file in files:
+            file.write_text(file.name)
+            # old enough to be memoized
+            os.utime(file, (1, 1))
+        act = act_builder(cache_inputs=["poetry.lock", "docker/*"])
+
+        read = []
+        monkeypatch.setattr(
+            utils, "get_file_digest", lambda file: read.append(file) or file.read_text()
+        )
+        key = act.get_cache_key()
+        assert read == files
+        assert act.get_cache_key() == key
+        assert read == files
+
+        files[2].write_text("changed")
+        os.utime(files[2], (2, 2))
+        assert act.get_cache_key() != key
+        assert read == [*files, files[2]]
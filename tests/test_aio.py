@@ -0,0 +1,109 @@
+import asyncio
+import gc
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from invoke.exceptions import UnexpectedExit
+
+from invoke_poetry.aio import async_task_matrix, async_venv_runner
+from invoke_poetry.matrix import TaskState
+
+
+class TestAnAsyncRunner:
+    """Test: An async runner..."""
+
+    def test_should_launch_commands_inside_the_venv(self, capsys):
+        """An async runner should launch commands inside the venv, raising on failures unless warned."""
+        run = async_venv_runner(Path(sys.prefix))
+
+        async def main():
+            result = await run("echo $VIRTUAL_ENV")
+            assert result.ok and result.stdout == f"{sys.prefix}\n"
+            result = await run("echo hidden; exit 3", warn=True, hide=True)
+            assert result.return_code == 3 and result.stdout == "hidden\n"
+            with pytest.raises(UnexpectedExit):
+                await run("exit 1")
+
+        asyncio.run(main())
+        assert capsys.readouterr().out == f"{sys.prefix}\n"
+
+    def test_should_kill_cancelled_commands_and_release_their_pipes(self, monkeypatch):
+        """An async runner should kill cancelled commands and release their pipes before the event loop is gone."""
+        unraisable = []
+        monkeypatch.setattr(sys, "unraisablehook", unraisable.append)
+        run = async_venv_runner(Path(sys.prefix))
+
+        async def main():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(run("sleep 10; echo done", hide=True), 0.2)
+
+        start = time.monotonic()
+        asyncio.run(main())
+        assert time.monotonic() - start < 5
+        gc.collect()
+        assert unraisable == []
+
+
+class TestAnAsyncTaskMatrix:
+    """Test: An async task matrix..."""
+
+    task_names = ["task_a", "task_b", "task_c", "task_d"]
+
+    def test_should_run_hooks_concurrently_with_a_limit(self):
+        """An async task matrix should run its hooks concurrently, up to the concurrency limit."""
+        running = []
+        peak = 0
+
+        async def hook(name: str) -> None:
+            nonlocal peak
+            running.append(name)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.1)
+            running.remove(name)
+            if name == "task_b":
+                raise ValueError("broken")
+
+        tm = asyncio.run(
+            async_task_matrix(
+                hook=hook,
+                hook_args_builder=lambda name: ([name], {}),
+                task_names=self.task_names,
+                max_concurrency=2,
+            )
+        )
+        assert peak == 2
+        assert [task.state for task in tm.tasks] == [
+            TaskState.OK,
+            TaskState.FAILED,
+            TaskState.OK,
+            TaskState.OK,
+        ]
+        assert tm.tasks[1].error == "ValueError: broken"
+
+    def test_should_be_able_to_cancel_running_hooks(self):
+        """An async task matrix should be able to cancel running hooks, killing their commands, after a failure."""
+        run = async_venv_runner(Path(sys.prefix))
+
+        async def hook(name: str) -> None:
+            await run("exit 1" if name == "task_a" else "sleep 10", hide=True)
+
+        tm = asyncio.run(
+            async_task_matrix(
+                hook=hook,
+                hook_args_builder=lambda name: ([name], {}),
+                task_names=self.task_names,
+                max_concurrency=3,
+                fail_fast=True,
+                cancel_running=True,
+            )
+        )
+        assert [task.state for task in tm.tasks] == [
+            TaskState.FAILED,
+            TaskState.CANCELLED,
+            TaskState.CANCELLED,
+            TaskState.SKIPPED,
+        ]
+        assert tm.tasks[0].return_code == 1
+        assert all(task.stats.wall_time < 5 for task in tm.tasks[:3])
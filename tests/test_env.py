@@ -220,3 +220,179 @@ class TestEnvOperation:
         assert not (self.test_root / "test_file").is_file()
         pytester.run(*inv_bin, "env.init", "-p", self.versions[0])
         assert (self.test_root / "test_file").is_file()
+
+    def test_init_should_be_able_to_create_and_install_all_envs_in_parallel(
+        self, pytester, inv_bin, poetry_bin, poetry_bin_str, add_test_file
+    ):
+        """Env operation init should be able to create and install all envs in parallel."""
+        versions = self.versions
+        # language=python prefix="versions=[] if True:" # IDE language injection
+        task_source = f"""
+            from invoke_poetry import init_ns
+            
+            def installer(c, quiet):
+                # mark the env the installer ran into
+                c.run("touch $(python -c 'import sys; print(sys.prefix)')/installed", hide=quiet)
+                
+            ns, task = init_ns(
+                "{versions[0]}", 
+                {versions},
+                poetry_bin="{poetry_bin_str}",
+                install_project_dependencies_hook=installer)
+            """
+        add_test_file(source=task_source, debug_mode=False)
+
+        result = pytester.run(*inv_bin, "env.init", "-a", "--parallel")
+        assert result.ret == ExitCode.OK
+        result.stdout.re_match_lines_random(
+            [r".*" + v.replace(".", r"\.") + r":.*OK" for v in versions]
+        )
+        # log lines are prefixed with the version once
+        result.stdout.re_match_lines_random(
+            [r".*> \[" + v.replace(".", r"\.") + r"\] Env ready\." for v in versions]
+        )
+
+        venvs_folder = self.test_root / ".venvs"
+        for version in versions:
+            venv_folder = next(venvs_folder.glob("./test*py" + version))
+            assert (venv_folder / "installed").is_file()
+
+        # the default env should end up being the active one
+        result = pytester.run(*poetry_bin, "run", "python", "--version")
+        assert versions[0] in result.outlines[0]
+        assert (self.test_root / ".venv").resolve() == next(
+            venvs_folder.glob("./test*py" + versions[0])
+        )
+
+    def test_init_should_be_able_to_clone_envs_from_templates(
+        self, pytester, inv_bin, poetry_bin, poetry_bin_str, add_test_file, monkeypatch
+    ):
+        """Env operation init should be able to clone envs from templates."""
+        versions = self.versions
+        templates = self.test_root / "templates"
+        # language=python prefix="versions=[];templates='' if True:" # IDE language injection
+        task_source = f"""
+            from invoke_poetry import init_ns
+            
+            def installer(c, quiet):
+                pass
+                
+            ns, task = init_ns(
+                "{versions[0]}", 
+                {versions},
+                poetry_bin="{poetry_bin_str}",
+                install_project_dependencies_hook=installer,
+                env_templates_path="{templates}")
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "env.init", "--template")
+        assert result.ret == ExitCode.OK
+        result.stdout.re_match_lines([r".*saved as template"])
+        # mark the template
+        template = next(templates.glob(f"py{versions[0]}*"))
+        (template / "marker").touch()
+
+        # a copy of the project, in a different folder
+        other_project = self.test_root / "other"
+        other_project.mkdir()
+        for file in ["tasks.py", "pyproject.toml", "poetry.toml"]:
+            shutil.copy(self.test_root / file, other_project / file)
+        monkeypatch.chdir(other_project)
+
+        result = pytester.run(*inv_bin, "env.init", "--template")
+        assert result.ret == ExitCode.OK
+        result.stdout.re_match_lines([r".*cloned from template"])
+        venv_folder = next((other_project / ".venvs").glob("./test*py" + versions[0]))
+        assert (venv_folder / "marker").is_file()
+        # paths pointing to the original venv should have been fixed
+        assert str(venv_folder) in (venv_folder / "bin" / "pip").read_text()
+        result = pytester.run(
+            *poetry_bin, "run", "python", "-c", "import sys; print(sys.prefix)"
+        )
+        assert result.outlines[-1] == str(venv_folder)
+
+    def test_init_should_skip_the_installation_if_nothing_changed(
+        self, pytester, inv_bin, poetry_bin_str, add_test_file
+    ):
+        """Env operation init should skip the installation if nothing changed."""
+        versions = self.versions
+        # language=python prefix="versions=[] if True:" # IDE language injection
+        task_source = f"""
+            from invoke_poetry import init_ns
+            from pathlib import Path
+            
+            # noinspection PyUnusedLocal
+            def installer(c, quiet):
+                with open("installs", "a") as f:
+                    f.write("x")
+                
+            ns, task = init_ns(
+                "{versions[0]}", 
+                {versions},
+                poetry_bin="{poetry_bin_str}",
+                install_project_dependencies_hook=installer)
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        installs = self.test_root / "installs"
+
+        pytester.run(*inv_bin, "env.init")
+        assert installs.read_text() == "x"
+        result = pytester.run(*inv_bin, "env.init")
+        result.stdout.re_match_lines([r".*installation skipped"])
+        assert installs.read_text() == "x"
+
+        # it can be forced
+        pytester.run(*inv_bin, "env.init", "--force")
+        assert installs.read_text() == "xx"
+
+        # any change in the project files should trigger a new installation
+        with open(self.test_root / "pyproject.toml", "a") as f:
+            f.write("\n")
+        pytester.run(*inv_bin, "env.init")
+        assert installs.read_text() == "xxx"
+
+    def test_init_should_not_skip_the_installation_after_a_failed_one(
+        self, pytester, inv_bin, poetry_bin_str, add_test_file
+    ):
+        """Env operation init should not skip the installation after a failed one."""
+        versions = self.versions
+        # language=python prefix="versions=[] if True:" # IDE language injection
+        task_source = f"""
+            from invoke_poetry import init_ns
+            
+            def installer(c, quiet):
+                with open("installs", "a") as f:
+                    f.write("x")
+                return c.run("exit 1", warn=True)
+                
+            ns, task = init_ns(
+                "{versions[0]}", 
+                {versions},
+                poetry_bin="{poetry_bin_str}",
+                install_project_dependencies_hook=installer)
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        installs = self.test_root / "installs"
+
+        pytester.run(*inv_bin, "env.init")
+        assert installs.read_text() == "x"
+        pytester.run(*inv_bin, "env.init")
+        assert installs.read_text() == "xx"
+
+
+class TestAVenvEnviron:
+    """Test: A venv environ..."""
+
+    def test_should_only_redirect_nested_poetry_commands_on_request(
+        self, tmp_path, monkeypatch
+    ):
+        """A venv environ should only redirect nested poetry commands to the venv on request, since poetry then loses
+        sight of the other project envs."""
+        from invoke_poetry.env import get_venv_environ
+
+        monkeypatch.delenv("POETRY_VIRTUALENVS_PATH", raising=False)
+        environ = get_venv_environ(tmp_path)
+        assert environ["VIRTUAL_ENV"] == str(tmp_path)
+        assert "POETRY_VIRTUALENVS_PATH" not in environ
+        environ = get_venv_environ(tmp_path, nested_poetry=True)
+        assert environ["POETRY_VIRTUALENVS_PATH"] == str(tmp_path)
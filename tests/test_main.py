@@ -112,6 +112,58 @@ class TestPoetryRunner:
         result = pytester.run(*inv_bin, "test")
         assert result.ret == ExitCode.OK
 
+    def test_should_be_able_to_run_commands_without_switching_the_active_env(
+        self, pytester, inv_bin, add_test_file, poetry_bin_str
+    ):
+        """poetry_runner should be able to run commands without switching the active env."""
+        # language=python prefix="if True:" # IDE language injection
+        task_source = f"""
+            from invoke_poetry import init_ns, poetry_runner
+            
+            ns, task = init_ns("3.8", supported_python_versions=["3.8", "3.9"], poetry_bin="{poetry_bin_str}")
+            
+            @task()
+            def test(c):
+                c.run("{poetry_bin_str} env use 3.8")
+                active_env_path = c.run("{poetry_bin_str} env info -p").stdout
+                with poetry_runner(c, python_env="3.9", direct=True) as run:
+                    assert "3.9" in run("python --version").stdout
+                    # nested poetry commands should still see the project envs
+                    assert active_env_path == run("{poetry_bin_str} env info -p").stdout
+                    assert active_env_path == c.run("{poetry_bin_str} env info -p").stdout
+                assert active_env_path == c.run("{poetry_bin_str} env info -p").stdout
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "test")
+        assert result.ret == ExitCode.OK
+
+    def test_should_be_able_to_skip_poetry_run(
+        self, pytester, inv_bin, add_test_file, poetry_bin_str
+    ):
+        """poetry_runner should be able to skip poetry run."""
+        # language=python prefix="if True:" # IDE language injection
+        task_source = f"""
+            from invoke_poetry import init_ns, poetry_runner
+            
+            ns, task = init_ns(
+                "3.8", supported_python_versions=["3.8", "3.9"], poetry_bin="{poetry_bin_str}", use_poetry_run=False
+            )
+            
+            @task()
+            def test(c):
+                with poetry_runner(c, python_env="3.9") as run:
+                    result = run("python --version")
+                    assert "{poetry_bin_str}" not in result.command
+                    assert "3.9" in result.stdout
+                    poetry_path = c.run("{poetry_bin_str} env info -p").stdout.strip()
+                    assert poetry_path in run("which python").stdout
+                with poetry_runner(c, python_env="3.8", poetry_run=True) as run:
+                    assert "{poetry_bin_str}" in run("python --version").command
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "test")
+        assert result.ret == ExitCode.OK
+
 
 class TestAnyAdditionalArgs:
     """Test: AnyAdditionalArgs..."""
@@ -234,3 +286,46 @@ class TestCollectionHandlers:
         # actually run the task
         result = pytester.run(*inv_bin, task_name)
         result.stdout.re_match_lines([out])
+
+
+class TestInstallProjectDependencies:
+    """Test: install_project_dependencies..."""
+
+    def test_should_only_skip_unchanged_installations_on_request(
+        self, tmp_path, monkeypatch, capsys
+    ):
+        """install_project_dependencies should only skip unchanged installations on request, keyed on the hook
+        arguments too."""
+        from invoke_poetry import install_project_dependencies
+        from invoke_poetry.settings import Settings
+
+        monkeypatch.chdir(tmp_path)
+        venv_path = tmp_path / "venv"
+        venv_path.mkdir()
+        (venv_path / "pyvenv.cfg").write_text("")
+        installs = []
+        monkeypatch.setattr(
+            Settings,
+            "install_project_dependencies_hook",
+            lambda c, *args, **kwargs: installs.append((args, kwargs)),
+            raising=False,
+        )
+
+        def install(*args, **kwargs):
+            install_project_dependencies(None, *args, venv_path=venv_path, **kwargs)
+
+        install("--all-extras", quiet=True)
+        install("--all-extras", quiet=True)
+        assert len(installs) == 2
+
+        install("--all-extras", quiet=True, skip_unchanged=True)
+        assert len(installs) == 2
+        assert "skipped" not in capsys.readouterr().out
+        install("--all-extras", quiet=False, skip_unchanged=True)
+        assert len(installs) == 2
+        assert "skipped" in capsys.readouterr().out
+
+        # different arguments need a new installation
+        install(quiet=True, skip_unchanged=True)
+        assert installs[-1] == ((), {"quiet": True})
+        assert len(installs) == 3
@@ -1,5 +1,16 @@
+import json
+import os
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytest
 from _pytest.config import ExitCode
 
+from invoke_poetry.cache import get_input_files
+from invoke_poetry.matrix import MatrixTask, TaskMatrix, TaskState, TaskStats
+
 
 class TestATaskMatrix:
     """Test: A task matrix..."""
@@ -212,3 +223,729 @@ class TestATaskMatrix:
         assert result.ret == ExitCode.OK
         result = pytester.run(*poetry_bin, "env", "info", "-p")
         result.stdout.re_match_lines([r"\.venvs\/.*py3.8"])
+
+    def test_should_be_able_to_run_tasks_in_parallel(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should be able to run tasks in parallel."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            import time
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                c.run(f"sleep 1 && echo 'name: {{name}}'")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                start = time.monotonic()
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    parallel=True,
+                    max_workers=4,
+                )
+                assert time.monotonic() - start < 3
+                assert [task.name for task in result.tasks] == {names}
+                result.print_report()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        assert result.ret == ExitCode.OK
+        result.stdout.re_match_lines([f".*{name}:.*OK" for name in self.task_names])
+
+    def test_should_skip_pending_parallel_tasks_when_a_user_send_a_sigint(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should skip pending parallel tasks when a user send a sigint."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            import time
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                if name == "task_a":
+                    time.sleep(1)
+                if name == "task_b":
+                    import os
+                    import signal 
+                    # simulate a sigint from the outside, that kills the running command
+                    os.kill(os.getpid(), signal.SIGINT)
+                    time.sleep(0.2)
+                    raise Exception
+                c.run(f"echo 'name: {{name}}'")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    parallel=True,
+                    max_workers=2,
+                )
+                result.print_report()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        result.stdout.re_match_lines(
+            [
+                # it was running when the sigint came
+                ".*task_a:.*INTERRUPTED",
+                ".*task_b:.*INTERRUPTED",
+                ".*task_c:.*SKIPPED",
+                ".*task_d:.*SKIPPED",
+            ]
+        )
+
+    def test_should_interrupt_running_parallel_pty_commands_when_a_user_send_a_sigint(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should interrupt running parallel commands when a user send a sigint, even if they run in a
+        pty, out of reach of the terminal sigint."""
+
+        # language=python prefix="if True:" # IDE language injection
+        task_source = """
+            import os
+            import signal
+            import threading
+            import time
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                if name == "task_b":
+                    # fork safety audit hooks (like filelock ones) may refuse concurrent pty forks
+                    time.sleep(0.3)
+                c.run("sleep 4", pty=True)
+                    
+            @task(name="matrix")
+            def test_task(c):
+                # simulate a sigint from the terminal, which does not reach the pty sessions
+                threading.Timer(1, os.kill, (os.getpid(), signal.SIGINT)).start()
+                start = time.monotonic()
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{}),
+                    task_names=["task_a", "task_b", "task_c"],
+                    parallel=True,
+                    max_workers=2,
+                )
+                assert time.monotonic() - start < 3
+                result.print_report()
+                result.exit_with_rc()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        assert result.ret == 1
+        result.stdout.re_match_lines(
+            [
+                ".*task_a:.*INTERRUPTED",
+                ".*task_b:.*INTERRUPTED",
+                ".*task_c:.*SKIPPED",
+            ]
+        )
+
+    def test_should_record_the_resources_used_by_every_task(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should record timings and spawned commands of every task, even when running in parallel."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            import json
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                for _ in range(int(name == "task_b") + 1):
+                    c.run("sleep 0.5", pty=name == "task_c")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    parallel=True,
+                )
+                stats = {{task.name: task.stats for task in result.tasks}}
+                assert [stats[name].spawned for name in {names}] == [1, 2, 1, 1]
+                for task_stats in stats.values():
+                    assert task_stats.wall_time >= 0.5
+                    assert task_stats.ended_at > task_stats.started_at
+                    assert task_stats.cpu_time is not None
+                    assert task_stats.children_peak_rss > 0
+                json.dumps(result.to_dict())
+                result.print_report()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        assert result.ret == ExitCode.OK
+        result.stdout.re_match_lines(
+            [r".*task_b:.*OK.*\(\d+\.\d+s, cpu .*, peak rss .*, 2 commands\)"]
+        )
+
+    def test_should_write_json_and_junit_reports(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should be able to write machine-readable reports as tasks conclude."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            import json
+            from pathlib import Path
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                if name == "task_b":
+                    # a report line should already be there for the first task
+                    assert len(Path("report.jsonl").read_text().splitlines()) == 1
+                    return c.run("exit 3")
+                return c.run(f"echo 'name: {{name}}'")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    json_report=Path("report.jsonl"),
+                    junit_report=Path("reports/junit.xml"),
+                )
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        assert result.ret == ExitCode.OK
+
+        lines = (pytester.path / "report.jsonl").read_text().splitlines()
+        tasks = [json.loads(line) for line in lines]
+        assert [(t["name"], t["state"], t["return_code"]) for t in tasks] == [
+            ("task_a", "OK", 0),
+            ("task_b", "FAILED", 3),
+            ("task_c", "OK", 0),
+            ("task_d", "OK", 0),
+        ]
+        assert tasks[1]["error"].startswith("UnexpectedExit")
+        assert all(t["wall_time"] is not None for t in tasks)
+
+        suite = ET.parse(pytester.path / "reports" / "junit.xml").getroot()
+        assert suite.get("tests") == "4"
+        assert suite.get("failures") == "1"
+        cases = suite.findall("testcase")
+        assert [case.get("name") for case in cases] == self.task_names
+        assert cases[1].find("failure").get("message") == "exited with return code 3"
+
+    def test_should_skip_remaining_tasks_after_a_failure_when_failing_fast(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should skip remaining tasks after the first failure when failing fast."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                c.run(f"exit {{int(name in ['task_b', 'task_c'])}}")
+                    
+            @task(name="matrix")
+            def test_task(c, max_failures=None):
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    fail_fast=True,
+                    max_failures=int(max_failures) if max_failures else None,
+                )
+                result.print_report()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        result.stdout.re_match_lines(
+            [".*task_a:.*OK", ".*task_b:.*FAILED", ".*task_c:.*SKIPPED"]
+        )
+        result = pytester.run(*inv_bin, "matrix", "--max-failures", "2")
+        result.stdout.re_match_lines(
+            [".*task_b:.*FAILED", ".*task_c:.*FAILED", ".*task_d:.*SKIPPED"]
+        )
+
+    def test_should_be_able_to_cancel_running_parallel_tasks(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should be able to cancel running parallel tasks, killing their commands."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            import time
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                if name == "task_a":
+                    c.run("exit 1")
+                else:
+                    c.run("sleep 10", pty=name == "task_c")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                start = time.monotonic()
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    parallel=True,
+                    max_workers=3,
+                    fail_fast=True,
+                    cancel_running=True,
+                )
+                assert time.monotonic() - start < 5
+                result.print_report()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        result.stdout.re_match_lines(
+            [
+                ".*task_a:.*FAILED",
+                ".*task_b:.*CANCELLED",
+                ".*task_c:.*CANCELLED",
+                # it may have been launched before the failure got noticed
+                ".*task_d:.*(SKIPPED|CANCELLED)",
+            ]
+        )
+
+    def test_should_kill_the_children_of_the_shell_of_cancelled_commands(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should kill the commands launched by the shell of cancelled commands, not only the shell."""
+
+        # language=python prefix="if True:" # IDE language injection
+        task_source = f"""
+            import time
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                if name == "task_a":
+                    time.sleep(1)
+                    c.run("exit 1")
+                else:
+                    # the shell does not exec its last command, and it's not a process group leader without a pty
+                    c.run("sh -c 'echo $$ > sleep.pid; exec sleep 10'; echo done")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                start = time.monotonic()
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names=["task_a", "task_b"],
+                    parallel=True,
+                    fail_fast=True,
+                    cancel_running=True,
+                )
+                assert time.monotonic() - start < 5
+                result.print_report()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        result.stdout.re_match_lines([".*task_a:.*FAILED", ".*task_b:.*CANCELLED"])
+
+        # the sleep has been killed too
+        pid = int((pytester.path / "sleep.pid").read_text())
+        with pytest.raises(ProcessLookupError):
+            for _ in range(20):
+                os.kill(pid, 0)
+                time.sleep(0.1)
+
+    def test_should_be_able_to_cache_ok_results(self, pytester, inv_bin, add_test_file):
+        """A task matrix should be able to skip tasks whose inputs did not change since their last OK run."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            from pathlib import Path
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                c.run(f"echo '{{name}}' >> runs.txt")
+                if name == "task_d":
+                    raise Exception
+                    
+            @task(name="matrix")
+            def test_task(c):
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    cache=True,
+                    cache_inputs=["src/*.py"],
+                )
+                result.print_report()
+                result.exit_with_rc()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        src = pytester.mkdir("src")
+        (src / "module.py").write_text("a = 1")
+        runs = pytester.path / "runs.txt"
+
+        pytester.run(*inv_bin, "matrix")
+        assert runs.read_text().split() == self.task_names
+        runs.unlink()
+
+        # only the failed task should be launched again
+        result = pytester.run(*inv_bin, "matrix")
+        assert result.ret == 1
+        result.stdout.re_match_lines(
+            [
+                ".*task_a:.*CACHED",
+                ".*task_b:.*CACHED",
+                ".*task_c:.*CACHED",
+                ".*task_d:.*FAILED",
+            ]
+        )
+        assert runs.read_text().split() == ["task_d"]
+        runs.unlink()
+
+        # a changed input should invalidate the cache
+        (src / "module.py").write_text("a = 2")
+        pytester.run(*inv_bin, "matrix")
+        assert runs.read_text().split() == self.task_names
+
+    def test_should_exit_with_an_error_unless_all_tasks_succeeded(self):
+        """A task matrix should exit with an error unless all tasks succeeded: skipped tasks did not."""
+        for states, rc in [
+            ([TaskState.OK, TaskState.CACHED, TaskState.FLAKY], 0),
+            ([TaskState.OK, TaskState.SKIPPED], 1),
+            ([TaskState.OK, TaskState.FAILED], 1),
+        ]:
+            tm = TaskMatrix(
+                tasks=[MatrixTask(name=str(i), state=s) for i, s in enumerate(states)]
+            )
+            with pytest.raises(SystemExit) as exit_info:
+                tm.exit_with_rc()
+            assert (exit_info.value.code or 0) == rc
+
+    def test_should_only_record_the_wall_time_of_tasks_without_os_wait4(
+        self, monkeypatch
+    ):
+        """A task matrix should only record the wall time of tasks on platforms lacking os.wait4, like Windows."""
+        monkeypatch.delattr(os, "wait4")
+        waitpid = os.waitpid
+        stats = TaskStats()
+        with stats.record():
+            assert os.waitpid is waitpid
+            subprocess.run(["true"], check=True)
+        assert stats.wall_time is not None and stats.spawned == 1
+        assert stats.cpu_time is None and stats.children_peak_rss is None
+
+    def test_should_only_use_files_tracked_by_git_as_default_cache_inputs(
+        self, pytester, monkeypatch
+    ):
+        """A task matrix should only use files tracked by git as default cache inputs, not untracked ones."""
+        monkeypatch.chdir(pytester.path)
+        pytester.makefile(".py", tracked="a = 1", untracked="b = 2")
+        subprocess.run(["git", "init", "-q"], check=True)
+        subprocess.run(["git", "add", "tracked.py"], check=True)
+        assert get_input_files() == [Path("tracked.py")]
+        assert get_input_files(["*.py"]) == [Path("tracked.py"), Path("untracked.py")]
+
+    def test_should_be_able_to_retry_failed_tasks(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should be able to retry failed tasks following the given policies."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix, RetryPolicy
+            
+            ns, task = init_ns("3.8")
+            
+            attempts = {{}}
+            
+            def my_hook(c: Context, name: str):
+                attempts[name] = attempts.get(name, 0) + 1
+                if name == "task_b" and attempts[name] < 3:
+                    # transient failure
+                    c.run("exit 2")
+                if name in ["task_c", "task_d"]:
+                    c.run("exit 3")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    retry=RetryPolicy(count=2, backoff=0.1, return_codes=[2, 3]),
+                    retry_overrides={{"task_d": RetryPolicy(count=1, return_codes=[2])}},
+                )
+                assert attempts == {{"task_a": 1, "task_b": 3, "task_c": 3, "task_d": 1}}
+                task_b = result.tasks[1]
+                assert [a.return_code for a in task_b.attempts] == [2, 2, 0]
+                assert task_b.stats.wall_time > 0.3
+                result.print_report()
+                result.exit_with_rc()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        assert result.ret == 1
+        result.stdout.re_match_lines(
+            [
+                ".*task_a:.*OK",
+                ".*task_b:.*FLAKY",
+                ".*task_c:.*FAILED",
+                ".*task_d:.*FAILED",
+            ]
+        )
+
+    def test_should_prefix_the_messages_of_parallel_tasks(
+        self, pytester, inv_bin, add_test_file, monkeypatch
+    ):
+        """A task matrix should prefix the messages of parallel tasks with their name, optionally as JSON lines."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            from invoke_poetry.logs import info
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                info(f"hello from {{name}}")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    parallel=True,
+                )
+                result.print_report()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        monkeypatch.setenv("FORCE_COLOR", "1")
+        result = pytester.run(*inv_bin, "matrix")
+        result.stdout.re_match_lines_random(
+            [
+                f"\x1b.*inv.* > \\[{name}\\] hello from {name}$"
+                for name in self.task_names
+            ]
+        )
+
+        monkeypatch.setenv("INVOKE_POETRY_LOG_FORMAT", "json")
+        result = pytester.run(*inv_bin, "matrix")
+        records = [json.loads(line) for line in result.stdout.lines if line]
+        assert {(r["level"], r["task"], r["message"]) for r in records} >= {
+            ("info", name, f"hello from {name}") for name in self.task_names
+        }
+        assert any(
+            r["level"] == "output" and r["message"].startswith("\ttask_a:\tOK")
+            for r in records
+        )
+
+    def test_should_launch_tasks_after_their_dependencies(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should launch tasks after their dependencies, skipping them if a dependency fails."""
+
+        # language=python
+        task_source = """
+            import pytest
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            launched = []
+            
+            def my_hook(c: Context, name: str):
+                launched.append(name)
+                if name == "test-b":
+                    c.run("exit 1")
+                    
+            @task(name="matrix")
+            def test_task(c, parallel=False):
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{}),
+                    task_names=["coverage", "test-a", "test-b", "lint", "build"],
+                    parallel=parallel,
+                    dependencies={
+                        "test-a": ["build"],
+                        "test-b": ["build"],
+                        "coverage": ["test-a", "test-b"],
+                    },
+                )
+                assert sorted(launched) == ["build", "lint", "test-a", "test-b"]
+                assert launched.index("build") < min(launched.index("test-a"), launched.index("test-b"))
+                with pytest.raises(ValueError, match="cycle"):
+                    task_matrix(
+                        hook=my_hook,
+                        hook_args_builder=lambda name: ([c, name],{}),
+                        task_names=["a", "b"],
+                        dependencies={"a": ["b"], "b": ["a"]},
+                    )
+                with pytest.raises(ValueError, match="Duplicated task names: a"):
+                    task_matrix(
+                        hook=my_hook,
+                        hook_args_builder=lambda name: ([c, name],{}),
+                        task_names=["a", "b", "a"],
+                    )
+                result.print_report()
+                result.exit_with_rc()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        for args in [[], ["--parallel"]]:
+            result = pytester.run(*inv_bin, "matrix", *args)
+            assert result.ret == 1
+            result.stdout.re_match_lines(
+                [
+                    ".*coverage:.*SKIPPED",
+                    ".*test-a:.*OK",
+                    ".*test-b:.*FAILED",
+                    ".*lint:.*OK",
+                    ".*build:.*OK",
+                ]
+            )
+
+    def test_should_launch_the_longest_tasks_first_with_history(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should record task durations and launch the longest parallel tasks first, with history."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            import json
+            from pathlib import Path
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            launched = []
+            
+            def my_hook(c: Context, name: str):
+                launched.append(name)
+                    
+            @task(name="matrix")
+            def test_task(c):
+                Path(".invoke-poetry").mkdir()
+                Path(".invoke-poetry/durations.json").write_text(json.dumps({{"task_b": 1.0, "task_d": 5.0}}))
+                task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    parallel=True,
+                    max_workers=1,
+                    history=True,
+                )
+                # task_a and task_c have no history, so they are expected to last as long as the average task
+                assert launched == ["task_d", "task_a", "task_c", "task_b"]
+                durations = json.loads(Path(".invoke-poetry/durations.json").read_text())
+                assert set(durations) == set({names})
+                assert durations["task_d"] < 5.0
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        assert result.ret == 0
+
+    def test_should_be_able_to_capture_the_output_of_every_task(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A task matrix should be able to capture the output of every task in its own log, reporting the last lines
+        of failed tasks only."""
+
+        names = str(self.task_names)
+
+        # language=python prefix="names=('')\nif True:" # IDE language injection
+        task_source = f"""
+            from pathlib import Path
+            from invoke import Context
+            from invoke_poetry import init_ns, task_matrix
+            
+            ns, task = init_ns("3.8")
+            
+            def my_hook(c: Context, name: str):
+                print(f"printed by {{name}}")
+                c.run(f"for i in $(seq 1 30); do echo {{name}} line $i; done")
+                c.run(f"echo hidden by {{name}}", hide=True)
+                if name == "task_c":
+                    c.run("echo broken >&2; exit 1")
+                    
+            @task(name="matrix")
+            def test_task(c):
+                result = task_matrix(
+                    hook=my_hook,
+                    hook_args_builder=lambda name: ([c, name],{{}}),
+                    task_names={names},
+                    parallel=True,
+                    capture=True,
+                )
+                log = Path(".invoke-poetry/logs/task_a.log").read_text()
+                assert log.startswith("printed by task_a\\ntask_a line 1\\n")
+                assert "task_a line 30" in log and "hidden" not in log
+                result.print_report()
+            """
+        add_test_file(source=task_source, debug_mode=False)
+        result = pytester.run(*inv_bin, "matrix")
+        assert result.ret == 0
+        result.stdout.no_re_match_line(".*(printed by|line 1$).*")
+        result.stdout.re_match_lines(
+            [
+                ".*task_c:.*FAILED",
+                r"task_c last output lines \(full log: .invoke-poetry/logs/task_c.log\):",
+                "\ttask_c line 12",
+                "\ttask_c line 30",
+                "\tbroken",
+            ]
+        )
+        assert "task_a last output" not in result.stdout.str()
+        assert (pytester.path / ".invoke-poetry/logs/task_c.log").exists()
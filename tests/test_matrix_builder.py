@@ -0,0 +1,58 @@
+import pytest
+
+from invoke_poetry.matrix_builder import MatrixBuilder, get_shard, parse_shard
+
+
+class TestAMatrixBuilder:
+    """Test: A matrix builder..."""
+
+    def test_should_expand_all_axes_combinations_following_the_rules(self):
+        """A matrix builder should expand all axes combinations, following the include and exclude rules."""
+        matrix = MatrixBuilder(
+            axes={"python": ["3.8", "3.9"], "deps": ["min", "max"]},
+            exclude=[{"python": "3.8", "deps": "max"}],
+            include=[{"python": "3.10", "deps": "max", "extras": "all"}],
+        )
+        assert matrix.get_names() == ["3.8-min", "3.9-min", "3.9-max", "3.10-max-all"]
+        assert matrix.get_entry("3.9-max") == {"python": "3.9", "deps": "max"}
+        builder = matrix.get_hook_args_builder(lambda entry: ([], entry))
+        assert builder("3.10-max-all") == ([], matrix.get_entries()[-1])
+        with pytest.raises(KeyError):
+            matrix.get_entry("3.8-max")
+
+    def test_should_refuse_entries_with_the_same_name(self):
+        """A matrix builder should refuse entries with the same name, which could not be told apart."""
+        matrix = MatrixBuilder(axes={"a": ["1", "1-2"], "b": ["2-3", "3"]})
+        with pytest.raises(ValueError, match="1-2-3"):
+            matrix.get_names()
+        matrix = MatrixBuilder(
+            axes={"python": ["3.8-min"]}, include=[{"python": "3.8", "deps": "min"}]
+        )
+        with pytest.raises(ValueError, match="3.8-min"):
+            matrix.get_entry("3.8-min")
+
+    def test_should_split_its_entries_in_shards(self):
+        """A matrix builder should split its entries in shards covering all of them once."""
+        matrix = MatrixBuilder(axes={"n": [str(n) for n in range(10)]})
+        shards = [matrix.get_names(shard=(k, 4)) for k in range(1, 5)]
+        assert shards[1] == ["1", "5", "9"]
+        assert sorted(sum(shards, []), key=int) == matrix.get_names()
+        assert parse_shard("2/4") == (2, 4)
+        for shard in ["0/4", "5/4", "2-4"]:
+            with pytest.raises(ValueError):
+                parse_shard(shard)
+        with pytest.raises(ValueError):
+            get_shard([], 3, 2)
+
+    def test_should_balance_shards_by_expected_duration(self):
+        """A matrix builder should balance shards by the expected duration of their entries."""
+        matrix = MatrixBuilder(axes={"python": ["3.8", "3.9", "3.10", "3.11"]})
+        durations = {"3.8": 10.0, "3.9": 4.0, "3.10": 3.0, "3.11": 2.0}
+        assert matrix.get_names(shard=(1, 2), durations=durations) == ["3.8"]
+        assert matrix.get_names(shard=(2, 2), durations=durations) == [
+            "3.9",
+            "3.10",
+            "3.11",
+        ]
+        # without durations shards are balanced by entry count
+        assert matrix.get_names(shard=(2, 2), durations={}) == ["3.9", "3.11"]
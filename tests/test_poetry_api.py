@@ -55,6 +55,38 @@ class TestAPoetryApi:
         result = pytester.run(*inv_bin, "test")
         assert result.ret == ExitCode.OK
 
+    def test_should_not_import_poetry_until_needed(
+        self, pytester, inv_bin, add_test_file
+    ):
+        """A poetry api should not import poetry until needed."""
+
+        # language=python prefix="if True:" # IDE language injection
+        test_source = f"""
+            import sys
+            from invoke_poetry import init_ns
+            from invoke_poetry.poetry_api import PoetryAPI
+            
+            ns, task = init_ns("3.8", supported_python_versions=["3.8", "3.9"])
+            
+            def poetry_imported() -> bool:
+                return any(name == "poetry" or name.startswith("poetry.") for name in sys.modules)
+            
+            assert not poetry_imported()
+            
+            @task(name="test")
+            def test_task(_):
+                assert not poetry_imported()
+                assert PoetryAPI.env_manager
+                assert poetry_imported()
+            """
+        add_test_file(test_source, debug_mode=False)
+
+        # listing tasks should work without ever importing poetry
+        result = pytester.run(*inv_bin, "-l")
+        assert result.ret == ExitCode.OK
+        result = pytester.run(*inv_bin, "test")
+        assert result.ret == ExitCode.OK
+
     def test_should_be_able_to_return_the_active_env_version(
         self, pytester, inv_bin, add_test_file, poetry_bin_str
     ):
@@ -237,3 +269,43 @@ class TestAPoetryApi:
         # actually run the task
         result = pytester.run(*inv_bin, "test")
         assert result.ret == ExitCode.OK
+
+    def test_should_cache_envs_discovery_until_poetry_state_changes(
+        self, pytester, inv_bin, add_test_file, poetry_bin_str
+    ):
+        """A poetry api should cache envs discovery until poetry state changes."""
+
+        # language=python prefix="if True:" # IDE language injection
+        test_source = f"""
+            from invoke_poetry import init_ns
+            from invoke_poetry.poetry_api import PoetryAPI
+            
+            ns, task = init_ns("3.8", supported_python_versions=["3.8", "3.9"])
+            
+            @task(name="test")
+            def test_task(c):
+                calls = []
+                original_list = PoetryAPI.env_manager.list
+                PoetryAPI.env_manager.list = lambda *args: calls.append(args) or original_list(*args)
+                
+                c.run("{poetry_bin_str} env use 3.8")
+                assert PoetryAPI.get_available_env_names() == ["3.8"]
+                assert PoetryAPI.get_active_project_env_version() == "3.8"
+                assert PoetryAPI.is_env_available("3.8")
+                assert len(calls) == 1
+                
+                # an external change should be detected
+                c.run("{poetry_bin_str} env use 3.9")
+                assert PoetryAPI.get_active_project_env_version() == "3.9"
+                assert len(calls) == 2
+                
+                # operations done through the api should invalidate the cache
+                PoetryAPI.remove_env("3.9")
+                assert PoetryAPI.get_available_env_names() == ["3.8"]
+                assert len(calls) == 3
+            """
+        add_test_file(test_source, debug_mode=False)
+
+        # actually run the task
+        result = pytester.run(*inv_bin, "test")
+        assert result.ret == ExitCode.OK